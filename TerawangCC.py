@@ -3,6 +3,7 @@ import pandas as pd
 import scipy
 import json
 import codecs
+from functools import cached_property
 
 def loadcsv(filename, delim=","):
     # Reads CSV from file
@@ -15,6 +16,44 @@ def loadjson(filename):
     # Returns as dict
     return data
 
+class GCCResult:
+    
+    '''
+    Result of gcc(). tau is available right away, the centred cc (order-5 spline shift)
+    and the lags are only computed when they are asked for.
+    '''
+    
+    # Still behaves like the old tuple: gcc(...)[0] or tau, cc, lags = gcc(...)
+    fields = ("tau", "cc", "lags")
+    
+    def __init__(self, tau, cc, n_sig, n_ref):
+        self.tau = tau
+        self.rawcc = cc
+        self.n_sig = n_sig
+        self.n_ref = n_ref
+    
+    @cached_property
+    def cc(self):
+        cc = scipy.ndimage.shift(self.rawcc, len(self.rawcc)/2, mode="grid-wrap", order = 5)
+        cc /= np.max(cc)
+        return cc
+    
+    @cached_property
+    def lags(self):
+        return scipy.signal.correlation_lags(self.n_sig, self.n_ref, mode= 'same')
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, name) for name in self.fields[index])
+        return getattr(self, self.fields[index])
+    
+    def __iter__(self):
+        for name in self.fields:
+            yield getattr(self, name)
+    
+    def __len__(self):
+        return len(self.fields)
+
 def gcc(sig, refsig, fs=1000000, interp=128, max_tau=None, CCType="PHAT", which=None, timestamp=None):
     
     '''
@@ -59,7 +98,6 @@ def gcc(sig, refsig, fs=1000000, interp=128, max_tau=None, CCType="PHAT", which=
     Integ = np.multiply(R,WEIGHT)
     
     cc = np.fft.irfft(a=Integ, axis=0, n=n)
-    lags = scipy.signal.correlation_lags(len(sig), len(refsig), mode= 'same')
 
     max_shift = int(interp * n / 2)
     if max_tau:
@@ -76,14 +114,14 @@ def gcc(sig, refsig, fs=1000000, interp=128, max_tau=None, CCType="PHAT", which=
     # shift = np.argmax(np.abs(cc)) - max_shift
     
     
-    cc = scipy.ndimage.shift(cc, len(cc)/2, mode="grid-wrap", order = 5)
-    cc /= np.max(cc)
+    # centred cc and lags are computed lazily, see GCCResult
+    result = GCCResult(None, cc, len(sig), len(refsig))
     
     tau = shift / float(interp * fs)
     
     if timestamp is not None:
         
-        peaktimestamp = timestamp[np.argmax(cc)]
+        peaktimestamp = timestamp[np.argmax(result.cc)]
         
         timestamp = scipy.ndimage.shift(timestamp, len(timestamp)/2, mode="grid-wrap", order = 5)
         
@@ -108,7 +146,8 @@ def gcc(sig, refsig, fs=1000000, interp=128, max_tau=None, CCType="PHAT", which=
 
     tau /= 10
     
-    return np.abs(tau), cc, lags
+    result.tau = np.abs(tau)
+    return result
 
 def onetap(sigdict: list, which: int, diameter = 0.3):
     
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from batch_assembler import BatchAssembler
+from ftp_listing import FtpListingIndex
+from ftp_pool import FtpSessionPool
+from index import (
+    DIAMETER, FTP_DOWNLOAD_RETRIES, FTP_FOLDER_DATA_ROW, FTP_HOST, FTP_KEEPALIVE_SECONDS, FTP_PASSWORD,
+    FTP_POOL_SIZE, FTP_PORT, FTP_USER, GROUPING_TIME_WINDOW_MINUTES, PEAK_REFINEMENT, TDOA_MATRIX,
+    BatchResult, SensorCapture, SigSpectrum, collect_ready_batches, deliver_batch, load_sigarray_from_json, onetap,
+    prepare_local_dirs, reconstruct_image, tdoa_matrix, validate_config,
+)
+
+# =============================================================================
+# KONFIGURASI BACKFILL
+# =============================================================================
+BACKFILL_SOURCE_FOLDER = os.getenv("BACKFILL_SOURCE_FOLDER", FTP_FOLDER_DATA_ROW) # Folder arsip yang dihitung ulang
+BACKFILL_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", "backfill_checkpoint.jsonl") # Satu baris per survei yang selesai
+BACKFILL_CHUNK_SURVEYS = int(os.getenv("BACKFILL_CHUNK_SURVEYS", 64)) # Survei yang diunduh dan dihitung sekaligus
+BACKFILL_PUBLISH = os.getenv("BACKFILL_PUBLISH", "0") == "1" # 1 = hasil juga dipublikasikan ke RabbitMQ
+
+
+# =============================================================================
+# FUNGSI BACKFILL
+# =============================================================================
+def batch_key(window):
+    """Kunci checkpoint satu batch: gabungan 8 nama file terurut."""
+    return "|".join(sorted(f['filename'] for f in window))
+
+def load_checkpoint(path):
+    """Membaca kunci batch yang sudah selesai dari file checkpoint (JSON per baris)."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['batch'])
+            except (ValueError, KeyError):
+                continue # baris terakhir bisa terpotong bila proses dihentikan paksa
+    return done
+
+def append_checkpoint(path, window):
+    """Mencatat satu batch yang selesai; ditulis langsung ke disk agar aman bila terputus."""
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"batch": batch_key(window), "time": datetime.now().isoformat()}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def list_archived_batches(ftp_pool):
+    """Mengambil isi folder arsip dan menyusunnya menjadi batch 8 file seperti main()."""
+    with ftp_pool.session() as ftp:
+        filenames = list(FtpListingIndex().list_entries(ftp))
+    print(f"{len(filenames)} file ditemukan di '{BACKFILL_SOURCE_FOLDER}'.")
+    assembler = BatchAssembler(GROUPING_TIME_WINDOW_MINUTES * 60)
+    return collect_ready_batches(assembler, filenames)
+
+def compute_surveys(survey_contents, diameter, tdoa=False):
+    """Menghitung banyak survei sekaligus, mengembalikan list BatchResult (satu per survei)."""
+
+    # Semua file ketukan dengan panjang sampel yang sama ditumpuk menjadi satu
+    # array (file x samples x kanal) dan dihitung dengan satu rfft/irfft batch.
+    # Dikelompokkan per panjang, bukan di-padding, agar cc sirkular dan pemetaan
+    # timestamp identik dengan process_batch().
+    velo = np.zeros((len(survey_contents), 8, 8), dtype=np.float32)
+    tdoas = np.zeros((len(survey_contents), 8, 8, 8))
+    buckets = defaultdict(list) # n -> [(survei, baris, SensorCapture)]
+    for survey, contents in enumerate(survey_contents):
+        # Urutan baris sama dengan process_batch(): nama file terurut, which = 1..8
+        for row, filename in enumerate(sorted(contents)):
+            capture = load_sigarray_from_json(filename, data=contents[filename])
+            if capture is None:
+                print(f"Gagal memproses {filename}, baris akan diisi nol.")
+                continue
+            buckets[capture.samples.shape[0]].append((survey, row, capture))
+
+    for n, items in buckets.items():
+        surveys, rows, captures = zip(*items)
+        stacked = SensorCapture(np.stack([c.samples for c in captures]), np.stack([c.timestamp for c in captures]))
+        spectrum = SigSpectrum(stacked)
+        velo[list(surveys), list(rows)] = onetap(spectrum, np.array(rows) + 1, diameter)
+        if tdoa:
+            tdoas[list(surveys), list(rows)] = tdoa_matrix(spectrum, refine=PEAK_REFINEMENT or None)
+
+    results = []
+    for matrix, tdoa_list in zip(velo, tdoas):
+        velo_list = np.nan_to_num(matrix, posinf=0).tolist()
+        results.append(BatchResult(velo_list, tdoa_list.tolist() if tdoa else None, reconstruct_image(velo_list)))
+    return results
+
+def backfill_chunk(ftp_pool, windows):
+    """Mengunduh, menghitung dan menyimpan hasil satu potongan batch, mengembalikan jumlah yang berhasil."""
+    filenames = [f['filename'] for window in windows for f in window]
+    contents = ftp_pool.fetch_many(filenames, retries=FTP_DOWNLOAD_RETRIES)
+    survey_contents = [{f['filename']: contents[f['filename']] for f in window} for window in windows]
+    results = compute_surveys(survey_contents, DIAMETER, tdoa=TDOA_MATRIX)
+
+    stored = 0
+    for window, survey, result in zip(windows, survey_contents, results):
+        if deliver_batch(ftp_pool, window, survey, result, publish=BACKFILL_PUBLISH, archive_sources=False):
+            append_checkpoint(BACKFILL_CHECKPOINT, window)
+            stored += 1
+    return stored
+
+# =============================================================================
+# EKSEKUSI UTAMA (BACKFILL)
+# =============================================================================
+def main():
+    """Menghitung ulang semua survei di folder arsip; bisa dilanjutkan dari checkpoint."""
+    validate_config(publish=BACKFILL_PUBLISH)
+    prepare_local_dirs()
+    ftp_pool = FtpSessionPool(FTP_HOST, FTP_PORT, FTP_USER, FTP_PASSWORD, size=FTP_POOL_SIZE,
+                              keepalive_seconds=FTP_KEEPALIVE_SECONDS, cwd=BACKFILL_SOURCE_FOLDER)
+    windows = list_archived_batches(ftp_pool)
+    done = load_checkpoint(BACKFILL_CHECKPOINT)
+    todo = [window for window in windows if batch_key(window) not in done]
+    print(f"{len(windows)} batch ditemukan, {len(windows) - len(todo)} sudah selesai, {len(todo)} akan dihitung ulang.")
+
+    stored = 0
+    for start in range(0, len(todo), BACKFILL_CHUNK_SURVEYS):
+        chunk = todo[start:start + BACKFILL_CHUNK_SURVEYS]
+        try:
+            stored += backfill_chunk(ftp_pool, chunk)
+        except Exception as e:
+            print(f"Error saat memproses potongan batch {start + 1}-{start + len(chunk)}: {e}")
+        print(f"[{datetime.now()}] Progres backfill: {min(start + len(chunk), len(todo))}/{len(todo)} batch.")
+
+    print(f"Backfill selesai: {stored} dari {len(todo)} batch berhasil disimpan.")
+    ftp_pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from collections import defaultdict
+
+
+class BatchAssembler:
+    """Menyusun batch 8 file per GUID secara bertahap dari file yang baru muncul."""
+
+    # Tiap GUID punya slot indeks 1-8. File yang lebih tua dari jendela waktu
+    # (relatif terhadap timestamp terbaru GUID tersebut) dibuang, dan batch
+    # langsung dikeluarkan begitu slot terakhir terisi.
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.slots = defaultdict(dict)  # guid -> {index: parsed_info}
+        self.latest = {}  # guid -> timestamp terbaru yang pernah dilihat
+
+    def add(self, parsed_info):
+        """Menambahkan satu file (hasil parse_filename), mengembalikan batch bila sudah lengkap."""
+        guid = parsed_info['guid']
+        timestamp = parsed_info['timestamp']
+        if parsed_info['index'] not in range(1, 9):
+            return None
+
+        latest = max(self.latest.get(guid, timestamp), timestamp)
+        if timestamp < latest - self.window_seconds:
+            return None  # file basi, di luar jendela waktu
+        self.latest[guid] = latest
+
+        slots = self.slots[guid]
+        slots[parsed_info['index']] = parsed_info  # file ulang untuk indeks yang sama menggantikan yang lama
+        for index, info in list(slots.items()):
+            if info['timestamp'] < latest - self.window_seconds:
+                del slots[index]
+
+        if len(slots) < 8:
+            return None
+
+        window = sorted(slots.values(), key=lambda x: x['timestamp'])
+        del self.slots[guid]
+        return window
+
+    def add_many(self, parsed_infos):
+        """Menambahkan banyak file (diurutkan menurut timestamp), mengembalikan semua batch yang lengkap."""
+        ready_batches = []
+        for parsed_info in sorted(parsed_infos, key=lambda x: x['timestamp']):
+            window = self.add(parsed_info)
+            if window:
+                ready_batches.append(window)
+        return ready_batches
+
+    def discard(self, filenames):
+        """Menghapus file yang sudah tidak ada di sumber dari slot."""
+        filenames = set(filenames)
+        for guid in list(self.slots):
+            slots = self.slots[guid]
+            for index, info in list(slots.items()):
+                if info['filename'] in filenames:
+                    del slots[index]
+            if not slots:
+                del self.slots[guid]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark waktu per survei (8 file ketukan di data/) sebelum dan sesudah GCC batch:
+#   "per pasangan": 7 panggilan gcc() per ketukan, masing-masing dengan rfft sendiri
+#                   (cara onetap() sebelum gcc_batch()).
+#   "batch":        satu SigSpectrum per file lalu onetap() (gcc_batch(), satu irfft batch).
+# Parsing file tidak ikut diukur.
+#
+#   python benchmark_gcc_batch.py
+
+import glob
+import timeit
+
+import numpy as np
+
+import index
+from geometry_cache import chord_lengths
+
+DATA_FILES = sorted(glob.glob("data/ketuk*.json"))
+REPEAT = 5
+
+
+def survey_per_pair(captures, diameter):
+    """Matriks kecepatan dengan 7 gcc() per ketukan, tiap panggilan menghitung FFT sendiri."""
+    chords = chord_lengths(diameter)
+    velo = np.zeros((len(captures), 8), dtype=np.float32)
+    for row, capture in enumerate(captures):
+        sigs = capture.samples.astype(index.COMPUTE_DTYPE)
+        for k in range(8):
+            if k == row:
+                continue
+            steps = min(abs(k - row), 8 - abs(k - row))
+            tof = index.gcc(sigs[:, k], sigs[:, row], timestamp=capture.timestamp,
+                            refine=index.PEAK_REFINEMENT or None).tau
+            velo[row, k] = chords[steps] / tof if tof else 0
+    return velo
+
+def survey_batch(captures, diameter):
+    """Matriks kecepatan lewat SigSpectrum + onetap() per ketukan."""
+    return np.vstack([index.onetap(index.SigSpectrum(c), row + 1, diameter) for row, c in enumerate(captures)])
+
+def main():
+    """Mencetak waktu per survei kedua cara dan memastikan hasilnya sama."""
+    captures = [index.load_sigarray_from_json(f) for f in DATA_FILES]
+    before = survey_per_pair(captures, index.DIAMETER)
+    after = survey_batch(captures, index.DIAMETER)
+    print(f"{len(captures)} ketukan, {captures[0].samples.shape[0]} sampel, refine={index.PEAK_REFINEMENT or '-'}")
+    print(f"  hasil sama: {np.array_equal(before, after)}")
+    for name, run in (("per pasangan", survey_per_pair), ("batch", survey_batch)):
+        seconds = min(timeit.repeat(lambda: run(captures, index.DIAMETER), number=REPEAT, repeat=3)) / REPEAT
+        print(f"  {name:<13} {seconds * 1e3:8.2f} ms per survei")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark dan pemeriksaan kesetaraan parse_sigarray_fast() terhadap parser JSON
+# (parse_sigarray_json(), dengan orjson bila terpasang dan dengan modul json
+# standar seperti loader lama). Waktu diukur pada data/ketuk*.json yang
+# sinyal dan timestamp-nya diulang agar menyerupai capture panjang.
+# Kesetaraan diperiksa pada file asli, variasi format penulisan, kasus yang
+# harus jatuh ke jalur JSON (kunci hilang, nilai pecahan, kanal kosong atau
+# hanya satu sampel) dan kasus tepi jalur cepat (jumlah sampel tidak sama,
+# nilai di luar rentang ADC, kunci ganda): hasil load_sigarray_from_json()
+# harus sama dengan parser JSON, termasuk dtype dan None untuk data tidak
+# lengkap atau terlalu pendek.
+#
+#   python benchmark_parser.py
+
+import contextlib
+import glob
+import io
+import json
+import sys
+import timeit
+
+import numpy as np
+
+import index
+
+DATA_FILES = sorted(glob.glob("data/ketuk*.json"))
+SCALES = (1, 100, 1000)
+
+
+def scaled_items(items, factor):
+    """Salinan isi file dengan sinyal dan timestamp diulang `factor` kali (timestamp tetap naik)."""
+    scaled = []
+    for item in items:
+        item = dict(item)
+        for key, values in item.items():
+            if key.startswith("value"):
+                item[key] = values * factor
+            elif key == "timestamp":
+                ts = np.asarray(values, dtype=np.int64)
+                span = ts[-1] - ts[0] + (ts[-1] - ts[0]) // (len(ts) - 1)
+                item[key] = np.concatenate([ts + j * span for j in range(factor)]).tolist()
+        scaled.append(item)
+    return scaled
+
+def parse_json_stdlib(data):
+    """Jalur JSON dengan modul json standar (loader sebelum parser cepat)."""
+    saved, index.orjson = index.orjson, None
+    try:
+        return index.parse_sigarray_json(data)
+    finally:
+        index.orjson = saved
+
+def same_capture(a, b):
+    """True bila kedua hasil None, atau sampel (beserta dtype) dan timestamp sama."""
+    if a is None or b is None:
+        return a is None and b is None
+    return (a.samples.dtype == b.samples.dtype and np.array_equal(a.samples, b.samples)
+            and np.array_equal(a.timestamp, b.timestamp))
+
+def variants(items):
+    """Kasus uji (nama, bytes, apakah parser cepat harus dipakai) dari satu isi file."""
+    def edit(key, change):
+        edited = [dict(item) for item in items]
+        for item in edited:
+            if key in item:
+                change(item)
+        return edited
+
+    yield "asli", json.dumps(items, separators=(',', ':')).encode(), True
+    yield "indent", json.dumps(items, indent=2).encode(), True
+    yield "spasi", json.dumps(items, separators=(', ', ' : ')).encode(), True
+    yield "kunci hilang", json.dumps(edit("value3", lambda item: item.pop("value3"))).encode(), False
+    yield "timestamp hilang", json.dumps(edit("timestamp", lambda item: item.pop("timestamp"))).encode(), False
+    yield "nilai pecahan", json.dumps(edit("value2", lambda item: item.update(
+        value2=[v + 0.5 for v in item["value2"]]))).encode(), False
+    yield "kanal lebih pendek", json.dumps(edit("value5", lambda item: item.update(
+        value5=item["value5"][:-7]))).encode(), True
+    yield "timestamp lebih pendek", json.dumps(edit("timestamp", lambda item: item.update(
+        timestamp=item["timestamp"][:-3]))).encode(), True
+    yield "kanal kosong", json.dumps(edit("value8", lambda item: item.update(value8=[]))).encode(), False
+    yield "satu sampel", json.dumps(edit("value6", lambda item: item.update(
+        value6=item["value6"][:1]))).encode(), False
+    yield "di luar rentang ADC", json.dumps(edit("value1", lambda item: item.update(
+        value1=[-v if k % 2 else v * 100 for k, v in enumerate(item["value1"])]))).encode(), True
+    yield "kunci ganda", json.dumps(items + [{"value4": items[3]["value4"][::-1]}]).encode(), True
+
+def check_equivalence():
+    """Memeriksa semua variasi pada semua file, mengembalikan (jumlah kasus, jumlah yang berbeda)."""
+    cases = failures = 0
+    for filename in DATA_FILES:
+        with open(filename, 'rb') as f:
+            items = json.load(f)
+        for name, data, fast_expected in variants(items):
+            cases += 1
+            with contextlib.redirect_stdout(io.StringIO()): # pesan validasi jalur JSON
+                fast = index.parse_sigarray_fast(data)
+                reference = parse_json_stdlib(data)
+                loaded = index.load_sigarray_from_json(filename, data)
+            ok = same_capture(loaded, reference) and (fast is not None) == fast_expected
+            if fast is not None:
+                ok = ok and same_capture(fast, reference)
+            if not ok:
+                failures += 1
+                print(f"BEDA {filename} ({name}): cepat={'ya' if fast is not None else 'tidak'}")
+    return cases, failures
+
+def main():
+    """Mencetak hasil pemeriksaan kesetaraan lalu waktu parsing tiap cara."""
+    if not DATA_FILES:
+        sys.exit("File data/ketuk*.json tidak ditemukan.")
+    cases, failures = check_equivalence()
+    print(f"Kesetaraan: {cases} kasus dari {len(DATA_FILES)} file, {failures} berbeda.")
+
+    with open(DATA_FILES[0], 'rb') as f:
+        items = json.load(f)
+    parsers = [("cepat", index.parse_sigarray_fast), ("json standar", parse_json_stdlib)]
+    if index.orjson:
+        parsers.insert(1, ("orjson", index.parse_sigarray_json))
+    for factor in SCALES:
+        data = json.dumps(scaled_items(items, factor)).encode()
+        capture = index.parse_sigarray_fast(data)
+        same = same_capture(capture, parse_json_stdlib(data))
+        print(f"{capture.samples.shape[0]} sampel ({len(data) / 1e6:.1f} MB), hasil sama: {same}")
+        number = max(1, 200 // factor)
+        for name, parse in parsers:
+            seconds = min(timeit.repeat(lambda: parse(data), number=number, repeat=3)) / number
+            print(f"  {name:<13} {seconds * 1e3:8.2f} ms")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
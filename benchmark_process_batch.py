@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark waktu process_batch() per survei (8 file ketukan di data/, di memori)
+# untuk tiga cara menghitung baris:
+#   "serial":          workers=1, semua baris di proses utama.
+#   "pool per batch":  ProcessPoolExecutor baru tiap batch (cara lama).
+#   "pool bersama":    get_process_pool(), pool yang sama dipakai ulang antar batch.
+# Diukur pada capture asli dan capture yang diperpanjang (sinyal diulang),
+# cache baris dimatikan. Perbedaan "pool per batch" dan "pool bersama" adalah
+# biaya membuat proses worker; percepatan paralel hanya terlihat bila mesin
+# punya lebih dari satu core.
+#
+#   python benchmark_process_batch.py
+
+import glob
+import json
+import os
+import timeit
+
+import numpy as np
+
+import index
+
+DATA_FILES = sorted(glob.glob("data/ketuk*.json"))
+SCALES = (1, 32)
+WORKERS = (2, 4, 8)
+REPEAT = 5
+
+
+def scaled_contents(factor):
+    """Isi 8 file ketukan (nama -> bytes) dengan sinyal dan timestamp diulang `factor` kali."""
+    contents = {}
+    for filename in DATA_FILES:
+        with open(filename, 'rb') as f:
+            items = json.load(f)
+        for item in items:
+            for key, values in item.items():
+                if key.startswith("value"):
+                    item[key] = values * factor
+                elif key == "timestamp":
+                    ts = np.asarray(values, dtype=np.int64)
+                    span = ts[-1] - ts[0] + (ts[-1] - ts[0]) // (len(ts) - 1)
+                    item[key] = np.concatenate([ts + j * span for j in range(factor)]).tolist()
+        contents[filename] = json.dumps(items).encode('utf-8')
+    return contents
+
+def run_serial(contents, workers):
+    """Satu batch tanpa process pool."""
+    return index.process_batch(list(contents), index.DIAMETER, workers=1, contents=contents)
+
+def run_per_batch_pool(contents, workers):
+    """Satu batch dengan pool baru yang ditutup setelah batch selesai."""
+    index.reset_process_pool()
+    velo = index.process_batch(list(contents), index.DIAMETER, workers=workers, contents=contents)
+    index.reset_process_pool()
+    return velo
+
+def run_shared_pool(contents, workers):
+    """Satu batch dengan pool bersama dari get_process_pool()."""
+    return index.process_batch(list(contents), index.DIAMETER, workers=workers, contents=contents)
+
+def timed(run, contents, workers):
+    """Waktu terbaik per batch (detik)."""
+    return min(timeit.repeat(lambda: run(contents, workers), number=REPEAT, repeat=3)) / REPEAT
+
+def main():
+    """Mencetak waktu per batch tiap cara dan memastikan hasilnya sama."""
+    index.ROW_CACHE_PATH = "" # cache baris mematikan perhitungan ulang, jadi dimatikan
+    print(f"{os.cpu_count()} CPU")
+    for factor in SCALES:
+        contents = scaled_contents(factor)
+        serial = run_serial(contents, 1)
+        samples = index.load_sigarray_from_json(DATA_FILES[0], contents[DATA_FILES[0]]).samples.shape[0]
+        print(f"{samples} sampel per kanal")
+        print(f"  {'serial':<22} {timed(run_serial, contents, 1) * 1e3:8.2f} ms per batch")
+        for workers in WORKERS:
+            same = np.array_equal(serial, run_shared_pool(contents, workers))
+            per_batch = timed(run_per_batch_pool, contents, workers)
+            shared = timed(run_shared_pool, contents, workers)
+            print(f"  {f'pool per batch ({workers})':<22} {per_batch * 1e3:8.2f} ms per batch")
+            print(f"  {f'pool bersama ({workers})':<22} {shared * 1e3:8.2f} ms per batch"
+                  f"  ({per_batch / shared:.1f}x, hasil sama: {same})")
+    index.reset_process_pool()
+
+if __name__ == "__main__":
+    main()
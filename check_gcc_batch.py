@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Pemeriksaan kesetaraan numerik gcc_batch()/onetap() terhadap gcc() per pasangan
+# pada file ketukan di data/. Untuk tiap file, kanal referensi, jalur timestamp
+# (dengan/tanpa) dan metode refine, tau gcc_batch() harus sama dengan tau gcc()
+# kanal yang sama (toleransi relatif 1e-12: irfft batch dan irfft satu kanal bisa
+# berbeda di digit pembulatan terakhir pada jalur parabolic tanpa timestamp).
+# Baris onetap() juga dibandingkan dengan kecepatan yang disusun dari 7
+# panggilan gcc(). Dengan rentang kecepatan (VELOCITY_MIN/MAX), semua kecepatan
+# bukan nol hasil onetap() harus berada di dalam rentang untuk tiap metode
+# refine, termasuk saat geseran sub-sampel melewati titik cermin timestamp.
+# process_batch() dijalankan dengan parameter bawaan (interp=128) sebagai uji regresi.
+#
+#   python check_gcc_batch.py
+
+import glob
+import sys
+
+import numpy as np
+
+import index
+from geometry_cache import chord_lengths
+
+DATA_FILES = sorted(glob.glob("data/ketuk*.json"))
+RTOL = 1e-12
+VELOCITY_RANGES = ((0.3, 5), (200, 8000), (0.1, 1000)) # m/s, (0.3, 5) memicu lompatan cermin di ketuk1
+ATOL = 1e-18 # tau dalam detik, orde 1e-6
+
+
+def gcc_loop_row(spectrum, which, diameter):
+    """Baris kecepatan dari 7 panggilan gcc() per pasangan, cara lama onetap()."""
+    chords = chord_lengths(diameter)
+    row = np.zeros(8)
+    for k in range(8):
+        if k == which - 1:
+            continue
+        steps = min(abs(k - which + 1), 8 - abs(k - which + 1))
+        tof = index.gcc(k, which - 1, spectrum=spectrum, timestamp=spectrum.timestamp,
+                        refine=index.PEAK_REFINEMENT or None).tau
+        row[k] = chords[steps] / tof if tof else 0
+    return row.astype(np.float32)
+
+def check_velocity_bounds(spectrum, filename):
+    """Kecepatan onetap() dengan rentang kecepatan harus di dalam rentang; mengembalikan jumlah pelanggaran."""
+    failures = 0
+    saved = index.VELOCITY_MIN, index.VELOCITY_MAX, index.PEAK_REFINEMENT
+    try:
+        for index.VELOCITY_MIN, index.VELOCITY_MAX in VELOCITY_RANGES:
+            for index.PEAK_REFINEMENT in ("", "parabolic", "sinc"):
+                for which in range(1, 9):
+                    row = index.onetap(spectrum, which, index.DIAMETER).astype(np.float64)
+                    velo = row[row > 0]
+                    # toleransi pembulatan float32 di batas rentang
+                    if np.any(velo < index.VELOCITY_MIN * (1 - 1e-6)) or np.any(velo > index.VELOCITY_MAX * (1 + 1e-6)):
+                        failures += 1
+                        print(f"DI LUAR RENTANG {filename} which={which} {index.VELOCITY_MIN:g}-"
+                              f"{index.VELOCITY_MAX:g} m/s refine={index.PEAK_REFINEMENT or '-'}: {row}")
+    finally:
+        index.VELOCITY_MIN, index.VELOCITY_MAX, index.PEAK_REFINEMENT = saved
+    return failures
+
+def main():
+    """Menjalankan semua pemeriksaan, keluar dengan status 1 bila ada yang berbeda."""
+    if not DATA_FILES:
+        sys.exit("File data/ketuk*.json tidak ditemukan.")
+    index.ROW_CACHE_PATH = "" # jangan menulis cache baris saat pemeriksaan
+    failures = 0
+    for filename in DATA_FILES:
+        spectrum = index.SigSpectrum(index.load_sigarray_from_json(filename))
+        for ref in range(8):
+            for timestamp in (spectrum.timestamp, None):
+                for refine in (None, "parabolic", "sinc"):
+                    batch = index.gcc_batch(spectrum, ref, timestamp=timestamp, refine=refine)
+                    single = [index.gcc(k, ref, spectrum=spectrum, timestamp=timestamp, refine=refine).tau
+                              for k in range(8)]
+                    if not np.allclose(batch, single, rtol=RTOL, atol=ATOL):
+                        failures += 1
+                        print(f"BEDA gcc_batch {filename} ref={ref} timestamp={timestamp is not None} "
+                              f"refine={refine}: {batch} vs {single}")
+            if index.VELOCITY_MAX <= 0 and not np.array_equal(
+                    index.onetap(spectrum, ref + 1, index.DIAMETER), gcc_loop_row(spectrum, ref + 1, index.DIAMETER)):
+                failures += 1
+                print(f"BEDA onetap {filename} which={ref + 1}")
+        failures += check_velocity_bounds(spectrum, filename)
+
+    velo = index.process_batch(DATA_FILES, index.DIAMETER)
+    print(f"process_batch bawaan: matriks {velo.shape}, {np.count_nonzero(velo)} kecepatan bukan nol.")
+    if failures:
+        sys.exit(f"{failures} pemeriksaan berbeda.")
+    print(f"Semua pemeriksaan sama untuk {len(DATA_FILES)} file.")
+
+if __name__ == "__main__":
+    main()
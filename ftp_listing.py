@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+from ftplib import error_perm
+
+
+class FtpListingIndex:
+    """Indeks isi folder FTP yang hanya melaporkan file baru/berubah sejak polling terakhir."""
+
+    # Memakai MLSD (size + modify) bila server mendukung, kalau tidak jatuh ke
+    # NLST dan hanya membandingkan nama file. Snapshot disimpan ke disk agar
+    # restart daemon tidak mengulang dari nol.
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self.entries = {}  # nama file -> (size, modify) atau None untuk NLST
+        self.use_mlsd = True
+        self.load()
+
+    def load(self):
+        """Memuat snapshot listing dari disk bila ada."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self.entries = {name: tuple(facts) if facts else None for name, facts in snapshot.items()}
+        except (OSError, ValueError) as e:
+            print(f"Snapshot listing FTP '{self.snapshot_path}' tidak bisa dibaca, mulai dari kosong: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Menyimpan snapshot listing ke disk (ditulis ke file sementara lalu diganti)."""
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error saat menyimpan snapshot listing FTP: {e}")
+
+    def list_entries(self, ftp):
+        """Mengambil isi folder aktif sebagai dict nama -> (size, modify)."""
+        if self.use_mlsd:
+            try:
+                return {
+                    name: (facts.get('size'), facts.get('modify'))
+                    for name, facts in ftp.mlsd(facts=['type', 'size', 'modify'])
+                    if facts.get('type', 'file') == 'file'
+                }
+            except error_perm as e:
+                print(f"Server FTP tidak mendukung MLSD ({e}), beralih ke NLST.")
+                self.use_mlsd = False
+        return {name: None for name in ftp.nlst()}
+
+    def poll(self, ftp):
+        """Membandingkan listing terbaru dengan snapshot, mengembalikan (baru_atau_berubah, terhapus)."""
+        current = self.list_entries(ftp)
+        changed = [name for name, facts in current.items() if self.entries.get(name, ()) != facts]
+        removed = [name for name in self.entries if name not in current]
+        self.entries = current
+        if changed or removed:
+            self.save()
+        return changed, removed
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import io
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from ftplib import FTP, all_errors
+
+
+class FtpSessionPool:
+    """Kumpulan sesi FTP yang sudah login dan dipakai ulang antar polling."""
+
+    # Sesi dibuat saat dibutuhkan sampai batas `size`. Sesi yang lama menganggur
+    # dicek dengan NOOP sebelum dipakai dan otomatis dibuat ulang bila putus.
+    def __init__(self, host, port, user, password, size=4, keepalive_seconds=60, cwd=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self.keepalive_seconds = keepalive_seconds
+        self.cwd = cwd
+        self.idle = queue.LifoQueue()  # (ftp, waktu terakhir dipakai)
+        self.slots = threading.Semaphore(self.size)
+
+    def connect(self):
+        """Membuka satu sesi FTP baru yang sudah login."""
+        ftp = FTP()
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.password)
+        if self.cwd:
+            ftp.cwd(self.cwd)
+        return ftp
+
+    def discard(self, ftp):
+        """Menutup sesi yang rusak tanpa mengembalikannya ke pool."""
+        try:
+            ftp.close()
+        except all_errors:
+            pass
+
+    def is_alive(self, ftp, last_used):
+        """Mengecek sesi dengan NOOP bila sudah menganggur lebih lama dari keepalive."""
+        if time.monotonic() - last_used < self.keepalive_seconds:
+            return True
+        try:
+            ftp.voidcmd('NOOP')
+            return True
+        except all_errors:
+            return False
+
+    @contextmanager
+    def session(self):
+        """Meminjam satu sesi dari pool; sesi yang error tidak dikembalikan."""
+        self.slots.acquire()
+        ftp = None
+        try:
+            while ftp is None:
+                try:
+                    ftp, last_used = self.idle.get_nowait()
+                except queue.Empty:
+                    ftp = self.connect()
+                    break
+                if not self.is_alive(ftp, last_used):
+                    self.discard(ftp)
+                    ftp = None
+            if self.cwd:
+                ftp.cwd(self.cwd)
+            yield ftp
+        except Exception:
+            if ftp is not None:
+                self.discard(ftp)
+            raise
+        else:
+            self.idle.put((ftp, time.monotonic()))
+        finally:
+            self.slots.release()
+
+    def keepalive(self):
+        """Mengirim NOOP ke sesi yang menganggur agar tidak diputus server."""
+        alive = []
+        while True:
+            try:
+                ftp, last_used = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_alive(ftp, last_used):
+                alive.append((ftp, time.monotonic()))
+            else:
+                self.discard(ftp)
+        for item in reversed(alive):
+            self.idle.put(item)
+
+    def fetch(self, remote_name, retries=2):
+        """Mengambil isi satu file ke memori dengan sesi dari pool, dicoba ulang bila gagal."""
+        for attempt in range(retries + 1):
+            buffer = io.BytesIO()
+            try:
+                with self.session() as ftp:
+                    ftp.retrbinary(f'RETR {remote_name}', buffer.write)
+                return buffer.getvalue()
+            except all_errors as e:
+                if attempt == retries:
+                    raise
+                print(f"Gagal mengunduh '{remote_name}' (percobaan {attempt + 1}): {e}, mencoba lagi...")
+
+    def fetch_many(self, remote_names, retries=2):
+        """Mengambil beberapa file secara paralel (maksimal `size` sekaligus), hasilnya dict nama -> bytes."""
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            contents = pool.map(lambda name: self.fetch(name, retries=retries), remote_names)
+            return dict(zip(remote_names, contents))
+
+    def close(self):
+        """Menutup semua sesi yang sedang menganggur."""
+        while True:
+            try:
+                ftp, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except all_errors:
+                self.discard(ftp)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse
+
+import tomography
+
+
+@lru_cache(maxsize=64)
+def chord_lengths(diameter, sensor_count=8):
+    """Panjang chord antar sensor di lingkaran menurut selisih nomor sensor (0 .. sensor_count/2)."""
+    # Untuk 8 sensor: 0, ab, ac, ad, ae seperti di onetap(). Cukup murah untuk
+    # dihitung ulang, jadi hanya disimpan di memori (tidak lewat GeometryCache);
+    # array dikunci read-only karena dipakai bersama antar pemanggil.
+    steps = np.arange(sensor_count // 2 + 1)
+    chords = float(diameter) * np.sin(np.pi * steps / sensor_count)
+    chords.setflags(write=False)
+    return chords
+
+class GeometryCache:
+    """Cache matriks sistem sinar-piksel tomografi per jumlah sensor, diameter dan grid."""
+
+    # Entri di memori diurutkan dari yang paling lama tidak dipakai dan dibuang
+    # bila melebihi `max_entries` (LRU), seperti RowCache. Tiap entri juga
+    # disimpan sebagai satu file .npz di folder `path`, sehingga survei lain dan
+    # daemon yang restart dengan diameter dan grid yang sama tinggal memuatnya.
+    def __init__(self, path=None, max_entries=16):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()  # kunci -> operator yang sudah jadi
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def filename(self, key):
+        """Nama file .npz untuk satu kunci."""
+        return os.path.join(self.path, "-".join(str(part) for part in key) + ".npz")
+
+    def get(self, key, build, to_arrays, from_arrays):
+        """Mengembalikan operator untuk kunci: dari memori, dari disk, atau dibangun lalu disimpan."""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        arrays = self.load(key)
+        if arrays is not None:
+            value = from_arrays(arrays)
+            counter = "disk_hits"
+        else:
+            value = build()
+            self.save(key, to_arrays(value))
+            counter = "misses"
+
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def load(self, key):
+        """Memuat array satu entri dari disk, atau None bila belum ada/tidak terbaca."""
+        if not self.path:
+            return None
+        filename = self.filename(key)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError) as e:
+            print(f"Cache geometri '{filename}' tidak bisa dibaca, dihitung ulang: {e}")
+            return None
+
+    def save(self, key, arrays):
+        """Menyimpan array satu entri ke disk (ditulis ke file sementara lalu diganti)."""
+        if not self.path:
+            return
+        filename = self.filename(key)
+        tmp_path = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, filename)
+        except OSError as e:
+            print(f"Error saat menyimpan cache geometri: {e}")
+
+    def system_matrix(self, grid, diameter, sensor_count=8, samples_per_pixel=2):
+        """(matriks csr, panjang sinar, mask) dari tomography.ray_system_matrix() untuk geometri ini."""
+        key = ("rays", sensor_count, repr(float(diameter)), grid, samples_per_pixel)
+        build = lambda: tomography.ray_system_matrix(grid, float(diameter), samples_per_pixel, sensor_count)
+        return self.get(key, build, pack_system_matrix, unpack_system_matrix)
+
+    def stats(self):
+        """Ringkasan untuk monitoring: hit memori, hit disk, miss dan isi cache."""
+        with self.lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "entries": len(self.entries)}
+
+def pack_system_matrix(system):
+    """Memecah (csr, panjang, mask) menjadi array biasa untuk .npz."""
+    matrix, lengths, mask = system
+    return {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+            "shape": np.array(matrix.shape), "lengths": lengths, "mask": mask}
+
+def unpack_system_matrix(arrays):
+    """Kebalikan pack_system_matrix()."""
+    matrix = scipy.sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                     shape=tuple(arrays["shape"]))
+    return matrix, arrays["lengths"], arrays["mask"]
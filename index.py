@@ -8,12 +8,35 @@ import os
 import pika
 import scipy
 import uuid # Ditambahkan untuk menghasilkan UUID
-from ftplib import FTP
-from collections import defaultdict
 from datetime import datetime
 import shutil
+import base64
+import threading
+import io
+import posixpath
+from ftplib import all_errors
+from functools import cached_property
+from typing import NamedTuple, Optional
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import warnings
 from dotenv import load_dotenv
 
+try:
+    import orjson # Opsional: parser JSON yang lebih cepat untuk jalur fallback
+except ImportError:
+    orjson = None
+
+from batch_assembler import BatchAssembler
+from ftp_listing import FtpListingIndex
+from geometry_cache import GeometryCache, chord_lengths
+from ftp_pool import FtpSessionPool
+from local_watch import LocalDirectoryWatcher
+from rabbitmq_publisher import RabbitMQPublisher
+from row_cache import RowCache
+import tomography
+
 # Muat variabel dari file .env
 load_dotenv()
 
@@ -22,7 +45,13 @@ load_dotenv()
 # =============================================================================
 # Konfigurasi Folder Lokal
 LOCAL_RESULT_DIR = "hasil_proses_lokal"
-LOCAL_TEMP_DIR = "temp_data" # Folder untuk mengunduh file & menyimpan hasil sementara
+LOCAL_TEMP_DIR = "temp_data" # Folder untuk menyimpan hasil sementara
+LOCAL_RAW_ARCHIVE_DIR = os.getenv("LOCAL_RAW_ARCHIVE_DIR", "") # Kosong = file mentah hanya diproses di memori
+
+# Sumber data: "ftp" (polling FTP_SOURCE_FOLDER) atau "local" (memantau LOCAL_WATCH_DIR)
+INGEST_MODE = os.getenv("INGEST_MODE", "ftp")
+LOCAL_WATCH_DIR = os.getenv("LOCAL_WATCH_DIR", "data_mentah")
+LOCAL_WATCH_POLL_SECONDS = float(os.getenv("LOCAL_WATCH_POLL_SECONDS", 0.5)) # Interval polling bila inotify tidak tersedia
 
 # Akses FTP
 FTP_HOST = os.getenv("FTP_HOST", "ftp-sth.pptik.id")
@@ -32,6 +61,10 @@ FTP_PASSWORD = os.getenv("FTP_PASSWORD", "Terawang@#2025")
 FTP_SOURCE_FOLDER = os.getenv("FTP_SOURCE_FOLDER", "/terawang") # Folder sumber di FTP
 FTP_FOLDER_HASIL = os.getenv("FTP_FOLDER_HASIL", "/result")
 FTP_FOLDER_DATA_ROW = os.getenv("FTP_FOLDER_DATA_ROW", "/data_row")
+FTP_LISTING_SNAPSHOT = os.getenv("FTP_LISTING_SNAPSHOT", "ftp_listing_snapshot.json") # Snapshot listing folder sumber
+FTP_POOL_SIZE = int(os.getenv("FTP_POOL_SIZE", 4)) # Jumlah sesi FTP paralel
+FTP_KEEPALIVE_SECONDS = int(os.getenv("FTP_KEEPALIVE_SECONDS", 60)) # Sesi menganggur dicek dengan NOOP setelah ini
+FTP_DOWNLOAD_RETRIES = int(os.getenv("FTP_DOWNLOAD_RETRIES", 2)) # Percobaan ulang per file
 
 # Akses RabbitMQ
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rmq230.pptik.id")
@@ -41,23 +74,102 @@ RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "Terawang@#2025")
 RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/terawang")
 RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE_RESULT", "result_queue")
 RABBITMQ_GRAPH_QUEUE = os.getenv("RABBITMQ_GRAPH_QUEUE", "graph_row")
+RABBITMQ_PUBLISH_RETRIES = int(os.getenv("RABBITMQ_PUBLISH_RETRIES", 5)) # Percobaan ulang (dengan backoff) per pesan
+
+# Format pesan hasil di RABBITMQ_QUEUE: "filename" (nama file hasil di FTP) atau
+# "inline" (matriks kecepatan ikut di pesan); unggah hasil ke FTP menjadi arsip opsional
+RESULT_MESSAGE_FORMAT = os.getenv("RESULT_MESSAGE_FORMAT", "filename")
+RESULT_FTP_ARCHIVE = os.getenv("RESULT_FTP_ARCHIVE", "1") == "1"
 
 # Konfigurasi Pemrosesan
 DIAMETER = 0.3
 PROCESSING_INTERVAL_SECONDS = 10
 GROUPING_TIME_WINDOW_MINUTES = 15
+COMPUTE_DTYPE = np.dtype(os.getenv("COMPUTE_PRECISION", "float64")) # float32 atau float64 untuk FFT
+# Rentang kecepatan gelombang yang masuk akal (m/s) untuk membatasi pencarian lag tiap chord,
+# misalnya 200 dan 8000 untuk kayu/batu. VELOCITY_MAX = 0 berarti pencarian lag tidak dibatasi.
+VELOCITY_MIN = float(os.getenv("VELOCITY_MIN", 0))
+VELOCITY_MAX = float(os.getenv("VELOCITY_MAX", 0))
+PEAK_REFINEMENT = os.getenv("PEAK_REFINEMENT", "sinc").strip().lower() # "parabolic", "sinc" atau kosong (puncak sampel bulat)
+# Pembobotan GCC: CC, PHAT, SCOT, ROTH, atau beberapa dipisah koma (tau = median antar pembobotan)
+GCC_WEIGHTING = tuple(w.strip().upper() for w in os.getenv("GCC_WEIGHTING", "PHAT").split(",") if w.strip()) or ("PHAT",)
+DIRECT_CC_MAX_LAGS = int(os.getenv("DIRECT_CC_MAX_LAGS", 32)) # Jendela lag <= ini dihitung langsung tanpa irfft
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", 1)) # >1 untuk menghitung 8 baris secara paralel
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 1)) # >1 untuk memproses beberapa batch sekaligus
+ROW_CACHE_PATH = os.getenv("ROW_CACHE_PATH", "row_cache.jsonl") # Kosong = cache baris tidak dipakai
+ROW_CACHE_MAX_ENTRIES = int(os.getenv("ROW_CACHE_MAX_ENTRIES", 4096)) # Batas baris sebelum yang lama dibuang (LRU)
+TDOA_MATRIX = os.getenv("TDOA_MATRIX", "0") == "1" # 1 = juga menghitung matriks TDOA 8x8 semua pasangan kanal tiap ketukan
+TOMOGRAPHY_GRID = int(os.getenv("TOMOGRAPHY_GRID", 0)) # Ukuran citra tomografi (mis. 128); 0 = tidak direkonstruksi
+TOMOGRAPHY_METHOD = os.getenv("TOMOGRAPHY_METHOD", "sirt") # "sirt" atau "backprojection"
+TOMOGRAPHY_ITERATIONS = int(os.getenv("TOMOGRAPHY_ITERATIONS", 50)) # Jumlah iterasi SIRT
+GEOMETRY_CACHE_DIR = os.getenv("GEOMETRY_CACHE_DIR", "geometry_cache") # Folder .npz matriks sistem tomografi; kosong = memori saja
+GEOMETRY_CACHE_MAX_ENTRIES = int(os.getenv("GEOMETRY_CACHE_MAX_ENTRIES", 16)) # Batas operator di memori (LRU)
 
 
 # =============================================================================
-# FUNGSI PEMROSESAN SINYAL (TIDAK DIUBAH)
+# FUNGSI PEMROSESAN SINYAL
 # =============================================================================
-def load_sigarray_from_json(filename):
-    """Memuat data sensor dan timestamp dari satu file JSON."""
+SIGARRAY_KEYS = [f'value{i}' for i in range(1, 9)] + ['timestamp'] # Urutan kunci kanal di file JSON
+ADC_MAX = np.iinfo(np.uint16).max # Sampel ADC 12-bit disimpan sebagai uint16
+MIN_CAPTURE_SAMPLES = 2 # Capture yang lebih pendek tidak bisa dikorelasikan
+
+class SensorCapture(NamedTuple):
+    """Data mentah satu file ketukan: 8 kanal ADC dan timestamp mikrodetik."""
+    samples: np.ndarray # (samples x 8), uint16 bila semua nilai ADC muat
+    timestamp: np.ndarray # (samples,), int64
+
+def compact_samples(samples):
+    """Menyimpan sampel ADC bilangan bulat sebagai uint16 bila rentangnya muat."""
+    if samples.dtype.kind in 'iu' and (samples.size == 0 or (samples.min() >= 0 and samples.max() <= ADC_MAX)):
+        return samples.astype(np.uint16)
+    return samples
+
+def parse_sigarray_fast(data):
+    """Parser cepat format capture: angka tiap kanal dibaca langsung ke array tanpa list Python."""
+    
+    # Mencari "valueN": [...] dan "timestamp": [...] lalu mengurai isinya dengan
+    # np.fromstring. Mengembalikan None bila struktur tidak sesuai harapan
+    # (kunci hilang, angka bukan bilangan bulat, dll.) sehingga pemanggil memakai
+    # parser JSON biasa beserta validasinya.
+    columns = []
+    for key in SIGARRAY_KEYS:
+        token = f'"{key}"'.encode()
+        pos = data.rfind(token) # kunci terakhir yang dipakai, sama seperti parser JSON
+        if pos < 0:
+            return None
+        start = data.find(b'[', pos)
+        end = data.find(b']', start)
+        if start < 0 or end < 0 or data[pos + len(token):start].strip() != b':':
+            return None
+        body = data[start + 1:end]
+        if not body.strip():
+            return None # kanal kosong: dtype hasilnya mengikuti jalur JSON
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", DeprecationWarning)
+                values = np.fromstring(body, dtype=np.int64, sep=',')
+        except (ValueError, DeprecationWarning):
+            return None
+        if len(values) != body.count(b',') + 1:
+            return None
+        columns.append(values)
+    
+    min_len = min(len(values) for values in columns)
+    if min_len < MIN_CAPTURE_SAMPLES:
+        return None # ditolak (dengan pesan) oleh jalur JSON
+    sensor_columns = columns[:8]
+    fits_uint16 = all(values.min() >= 0 and values.max() <= ADC_MAX for values in sensor_columns)
+    samples = np.empty((min_len, 8), dtype=np.uint16 if fits_uint16 else np.int64)
+    for k, values in enumerate(sensor_columns):
+        samples[:, k] = values[:min_len]
+    return SensorCapture(samples, columns[8][:min_len])
+
+def parse_sigarray_json(data, filename=""):
+    """Parser JSON biasa beserta validasinya, jalur fallback parse_sigarray_fast()."""
     all_sensor_data = {}
     timestamp_data = None
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            json_content = json.load(f)
+        json_content = orjson.loads(data) if orjson else json.loads(data)
     except Exception as e:
         print(f"Error reading/parsing JSON {filename}: {e}")
         return None
@@ -78,290 +190,730 @@ def load_sigarray_from_json(filename):
         return None
             
     try:
-        sensor_arrays = [all_sensor_data[f'value{i}'] for i in range(1, 9)]
-        arrays_to_stack = sensor_arrays + [timestamp_data]
-        min_len = min(len(arr) for arr in arrays_to_stack)
-        sigarray = np.column_stack([np.array(arr[:min_len]) for arr in arrays_to_stack])
-        return sigarray
+        sensor_arrays = [all_sensor_data[key] for key in SIGARRAY_KEYS[:8]]
+        min_len = min(len(arr) for arr in sensor_arrays + [timestamp_data])
+        if min_len < MIN_CAPTURE_SAMPLES:
+            # rfft butuh sampel; capture sependek ini menjadi baris nol, bukan batch gagal
+            print(f"Error: Capture di file {filename} hanya {min_len} sampel")
+            return None
+        samples = np.column_stack([np.array(arr[:min_len]) for arr in sensor_arrays])
+        return SensorCapture(compact_samples(samples), np.array(timestamp_data[:min_len], dtype=np.int64))
     except Exception as e:
         print(f"Error saat menyusun numpy array: {e}")
         return None
 
-def gcc(sig, refsig, fs=1000000, max_tau=None, interp=128, timestamp=None) -> tuple:
-    """Menghitung Generalized Cross-Correlation."""
+def load_sigarray_from_json(filename, data=None):
+    """Memuat data sensor dan timestamp dari satu file JSON (atau dari isi file di memori)."""
+    try:
+        if data is None:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        elif isinstance(data, str):
+            data = data.encode('utf-8')
+    except Exception as e:
+        print(f"Error reading/parsing JSON {filename}: {e}")
+        return None
+    
+    capture = parse_sigarray_fast(data)
+    if capture is not None:
+        return capture
+    return parse_sigarray_json(data, filename)
+
+class SigSpectrum:
+    """Spektrum rfft (tanpa komponen DC) dari 8 kanal satu file ketukan, dihitung sekali."""
+    
+    # Dipakai ulang oleh gcc(), gcc_batch() dan onetap() sehingga pembobotan lain,
+    # TDOA semua pasangan atau max_tau berbeda tidak perlu FFT ulang.
+    # Sampel baru diubah ke float (float32/float64) di sini, tepat sebelum FFT.
+    # SensorCapture bertumpuk (file x samples x kanal, timestamp file x samples)
+    # menghasilkan spektrum (file x kanal x bin) untuk diproses sekaligus.
+    def __init__(self, sigarray, dtype=None):
+        if isinstance(sigarray, SensorCapture):
+            sigs, self.timestamp = sigarray
+        else:
+            # array lama (samples x 9) dengan timestamp di kolom terakhir
+            sigs = sigarray[:, :8]
+            self.timestamp = sigarray[:, 8] if sigarray.shape[1] > 8 else None
+        self.n = sigs.shape[-2]
+        
+        # Remove DC component
+        sigs = sigs.astype(dtype or COMPUTE_DTYPE)
+        sigs -= np.mean(sigs, axis=-2, keepdims=True)
+        
+        # (kanal x bin frekuensi)
+        self.spectra = np.swapaxes(np.fft.rfft(sigs, axis=-2, n=self.n), -1, -2)
+        self.magnitudes = np.abs(self.spectra)
     
-    # Generalized Cross Correlation Phase Transform
-    n = len(sig)
+    @cached_property
+    def timing(self):
+        """TimingContext timestamp file ini (None bila tanpa timestamp), dihitung sekali."""
+        return TimingContext(self.timestamp) if self.timestamp is not None else None
+
+class TimingContext:
+    """Timestamp satu file ketukan yang sudah digeser n/2 beserta batas a, b, c, d, dihitung sekali per file."""
+    
+    # Semua pasangan kanal dan pembobotan dari file yang sama memakai tabel ini,
+    # jadi pergeseran timestamp tidak diulang untuk tiap gcc. Untuk timestamp
+    # bertumpuk (file x samples) batasnya (file x 1).
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.n = timestamp.shape[-1]
+        self.shifted = shift_half(timestamp, 1)
+        self.a = self.shifted[..., 0:1] # first possible timestamp on the dataframe
+        self.d = self.shifted[..., -1:] # last possible timestamp on the dataframe
+        self.lag_taus = {} # max_shift -> tau tiap posisi cc terpusat
+    
+    def bounds(self, max_shift):
+        """Mengembalikan (a, b, c) untuk jendela max_shift."""
+        b = self.shifted[..., max_shift:max_shift+1] # timestamp that corresponds fo the end of smalltimestamp
+        c = self.shifted[..., -max_shift-1:][..., :1] # timestamp that corresponds to the start of the smalltimestamp
+        return self.a, b, c
+    
+    def tau(self, peaktimestamp, max_shift):
+        """tau (mikrodetik) dari timestamp puncak, sama dengan jalur timestamp gcc()."""
+        a, b, c = self.bounds(max_shift)
+        return np.where((a > peaktimestamp) & (peaktimestamp >= b),
+                        peaktimestamp - a, # in micros
+                        -peaktimestamp + c) # in micros, negative
+    
+    def lag_tau(self, max_shift):
+        """tau (detik, dibulatkan ke mikrodetik) untuk tiap posisi cc terpusat, disimpan per max_shift."""
+        if max_shift not in self.lag_taus:
+            self.lag_taus[max_shift] = self.tau(self.timestamp, max_shift).astype(np.int64) / 1000000
+        return self.lag_taus[max_shift]
+    
+    def at(self, position):
+        """Timestamp asli pada posisi sampel (bulat, atau pecahan dengan interpolasi linear)."""
+        # Sumbu depan tambahan pada position (mis. pembobotan) di-broadcast
+        position = np.asarray(position)
+        timestamp = self.timestamp.reshape((1,) * (position.ndim - self.timestamp.ndim) + self.timestamp.shape)
+        if position.dtype.kind in 'iu':
+            return np.take_along_axis(timestamp, position, axis=-1)
+        return interp_timestamp(timestamp, position)
+
+def timing_context(timestamp, spectrum=None):
+    """TimingContext untuk timestamp; dipakai ulang dari SigSpectrum bila timestamp-nya sama."""
+    if timestamp is None or isinstance(timestamp, TimingContext):
+        return timestamp
+    if spectrum is not None and timestamp is spectrum.timestamp:
+        return spectrum.timing
+    return TimingContext(np.asarray(timestamp))
+
+class GCCResult:
+    """Hasil gcc(): tau langsung tersedia, cc terpusat dan lags dihitung saat diminta."""
+    
+    # Tetap bisa dipakai seperti tuple lama: gcc(...)[0] atau tau, cc, lags = gcc(...)
+    fields = ("tau", "cc", "lags")
+    
+    def __init__(self, tau, cc, n_sig, n_ref):
+        self.tau = tau
+        self.rawcc = cc
+        self.n_sig = n_sig
+        self.n_ref = n_ref
+    
+    @cached_property
+    def cc(self):
+        cc = shift_half(self.rawcc, 1)
+        cc /= np.max(cc)
+        return cc
     
-    # Remove DC component
-    sig = sig - np.mean(sig, axis=0)
-    refsig = refsig - np.mean(refsig, axis=0)
+    @cached_property
+    def lags(self):
+        return scipy.signal.correlation_lags(self.n_sig, self.n_ref, mode= 'same')
     
-    # RFFT because it's faster, it doesn't compute the negative side
-    SIG = np.fft.rfft(sig, axis=0, n=n)
-    REFSIG = np.fft.rfft(refsig, axis=0, n=n)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, name) for name in self.fields[index])
+        return getattr(self, self.fields[index])
+    
+    def __iter__(self):
+        for name in self.fields:
+            yield getattr(self, name)
+    
+    def __len__(self):
+        return len(self.fields)
+
+def gcc(sig, refsig, fs=1000000, max_tau=None, interp=128, timestamp=None, spectrum=None, refine=None) -> GCCResult:
+    """Menghitung Generalized Cross-Correlation."""
+    
+    # Bila spectrum (SigSpectrum) diberikan, sig dan refsig adalah indeks kanal
+    # dan spektrum yang sudah ada dipakai ulang tanpa FFT baru.
+    # refine ("parabolic"/"sinc", lihat refine_peak()) memberi tau dengan presisi sub-sampel;
+    # interp hanya dipakai sebagai faktor upsample lokal untuk refine="sinc".
+    if spectrum is not None:
+        n = spectrum.n
+        SIG = spectrum.spectra[sig]
+        REFSIG = spectrum.spectra[refsig]
+    else:
+        # Generalized Cross Correlation Phase Transform
+        n = len(sig)
+        
+        # Remove DC component
+        sig = sig - np.mean(sig, axis=0)
+        refsig = refsig - np.mean(refsig, axis=0)
+        
+        # RFFT because it's faster, it doesn't compute the negative side
+        SIG = np.fft.rfft(sig, axis=0, n=n)
+        REFSIG = np.fft.rfft(refsig, axis=0, n=n)
     R = SIG * np.conj(REFSIG)
     
     WEIGHT = 1 / (np.abs(R) + 1e-10) # No need to use anything else other than PHAT
     
     Integ = R * WEIGHT
     cc = np.fft.irfft(Integ, axis=0, n=n)
-    lags = scipy.signal.correlation_lags(len(sig), len(refsig), mode= 'same')
 
-    max_shift = int(interp * n / 2)
+    max_shift = int(n / 2)
     
     if max_tau:
-        max_shift = min(int(interp * fs * max_tau), max_shift)
+        max_shift = min(int(fs * max_tau), max_shift)
 
-    smallcc = np.concatenate((cc[-max_shift:], cc[:max_shift+1]))
-    smallcc /= np.max(cc)
+    window = np.arange(n)
+    window = np.concatenate((window[-max_shift:], window[:max_shift+1]))
+    smallcc = cc[window] / np.max(cc)
     
     # find max cross correlation index
-    shift = np.argmax(smallcc) - max_shift
+    peak = np.argmax(smallcc)
+    shift = peak - max_shift
     
     # Sometimes, there is a 180-degree phase difference between the two microphones.
     # shift = np.argmax(np.abs(cc)) - max_shift
     
-    cc = scipy.ndimage.shift(cc, len(cc)/2, mode="grid-wrap", order = 5)
-    cc /= np.max(cc)
+    # cc terpusat (spline order 5) dan lags baru dihitung bila diminta
+    result = GCCResult(None, cc, n, n)
     
-    tau = shift / float(interp * fs)
+    if refine and timestamp is None:
+        shift = shift + refine_peak(Integ[None], n, window[[peak]], refine, interp)[0]
+    tau = shift / float(fs)
     
     if timestamp is not None:
         
-        peaktimestamp = timestamp[np.argmax(cc)]
-        
-        timestamp = scipy.ndimage.shift(timestamp, len(timestamp)/2, mode="grid-wrap", order = 5)
-        
-        a = timestamp[0] # first possible timestamp on the dataframe
-        b = timestamp[max_shift] # timestamp that corresponds fo the end of smalltimestamp 
-        c = timestamp[-max_shift-1] # timestamp that corresponds to the start of the smalltimestamp
-        d = timestamp[-1] # last possible timestamp on the dataframe
-        # smalltimestamp = np.concatenate((timestamp[-max_shift:], timestamp[:max_shift+1]))
-        # peaktimestamp = smalltimestamp[np.argmax(smallcc)]
+        # Timestamp yang sudah digeser dan batas a, b, c, d diambil dari TimingContext per file
+        timing = timing_context(timestamp, spectrum)
+        peak = np.argmax(result.cc)
+        if refine:
+            # Posisi puncak sub-sampel; timestamp di antara dua sampel diinterpolasi linear
+            peak = peak + refine_peak(Integ[None], n, [peak - n / 2], refine, interp)[0]
+        peaktimestamp = timing.at(np.array([peak]))[0]
         
-        if a > peaktimestamp >=  b:
-            tau = int(peaktimestamp - a) # in micros
-        else:
-            tau = int(-peaktimestamp + c) # in micros, negative
-        tau /= 1000000 # convert to seconds
+        tau = timing.tau(peaktimestamp, max_shift)[0]
+        tau = (tau if refine else int(tau)) / 1000000 # convert to seconds
 
     tau /= 10
     
-    return np.abs(tau), cc, lags
+    result.tau = np.abs(tau)
+    return result
+
+PEAK_REFINEMENTS = ("parabolic", "sinc")
+
+def phase_ramp(shift, count, n) -> np.ndarray:
+    """exp(2j*pi*shift*f/n) untuk f = 0..count-1, per shift bila shift berupa array."""
+    # f = q*block + r, jadi cukup dua tabel exp sepanjang ~sqrt(count) lalu hasil
+    # kali luarnya; jauh lebih murah daripada exp untuk setiap bin. Bagian bulat
+    # shift*f direduksi modulo n dengan aritmetika integer agar sudutnya tetap kecil
+    # (presisi tidak turun untuk capture panjang).
+    block = int(np.ceil(np.sqrt(count)))
+    shift = np.asarray(shift, dtype=np.float64)[..., None]
+    whole = np.floor(shift)
+    frac = shift - whole
+    whole = whole.astype(np.int64) % n
+    def table(m):
+        return np.exp(2j * np.pi * ((whole * m) % n + frac * m) / n)
+    steps = np.arange(block)
+    ramp = table(steps * block)[..., :, None] * table(steps)[..., None, :]
+    return ramp.reshape(ramp.shape[:-2] + (-1,))[..., :count]
+
+def direct_cc(integ, n, indices) -> np.ndarray:
+    """Mengevaluasi irfft(integ, n) hanya pada indeks sampel tertentu (DFT langsung)."""
+    # x[k] = (1/n) * sum_f w_f * Re(X_f * exp(2j*pi*f*k/n)), w_f = 2 kecuali bin DC dan Nyquist
+    kernel = phase_ramp(np.asarray(indices) % n, integ.shape[-1], n).T
+    kernel[1:] *= 2
+    if n % 2 == 0:
+        kernel[-1] /= 2
+    return (integ @ kernel).real / n
+
+def peak_phase_table(n, count, step, deltas) -> np.ndarray:
+    """exp(2j*pi*d*step*f/n) untuk tiap pengali d di deltas dan bin f (len(deltas) x bin)."""
+    base = phase_ramp(step, count, n)
+    powers = {0: np.ones_like(base), 1: base}
+    for d in range(2, max(abs(d) for d in deltas) + 1):
+        powers[d] = powers[d - 1] * base
+    return np.stack([powers[d] if d >= 0 else np.conj(powers[-d]) for d in deltas])
+
+def refine_peak(integ, n, peak, method="parabolic", interp=128) -> np.ndarray:
+    """Pergeseran sub-sampel puncak cc tiap kanal di sekitar indeks puncak (boleh pecahan)."""
+    
+    # cc pada waktu peak + t dievaluasi langsung dari cross-spectrum integ
+    # (interpolasi band-limited, DFT pada beberapa titik saja), jadi tidak perlu
+    # irfft yang interp kali lebih panjang dan tidak ada kernel (bin x titik) yang
+    # disimpan; biaya O(bin) per titik sehingga tetap ringan untuk capture panjang.
+    # parabolic: verteks parabola lewat cc di -1, 0, 1, hasil di [-0.5, 0.5].
+    # sinc: argmax pada grid 1/interp sampel di [-1, 1], dicari kasar-ke-halus:
+    #       mula-mula tiap 1/8 sampel di seluruh [-1, 1] (cc band-limited tidak punya
+    #       dua puncak sedekat itu), lalu 5 titik berjarak S di sekitar titik terbaik
+    #       (menutup +-S/2 dari titik tahap sebelumnya), S dibagi empat sampai 1/interp.
+    if method not in PEAK_REFINEMENTS:
+        raise ValueError(f"Metode refine tidak dikenal: {method}")
+    count = integ.shape[-1]
+    weights = np.full(count, 2.0) # x[t] = (1/n) * sum_f w_f * Re(X_f * exp(2j*pi*f*t/n))
+    weights[0] = 1
+    if n % 2 == 0:
+        weights[-1] = 1
+    centred = integ * weights * phase_ramp(peak, count, n)
+    
+    if method == "parabolic":
+        values = (centred @ peak_phase_table(n, count, 1, (-1, 0, 1)).T).real / n
+        left, centre, right = np.moveaxis(values, -1, 0)
+        curvature = left - 2 * centre + right
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.0)
+        return np.clip(delta, -0.5, 0.5)
+    
+    best = np.zeros(centred.shape[:-1], dtype=np.int64) # posisi terbaik, satuan 1/interp sampel
+    step = max(1, -(-interp // 8))
+    reach = -(-interp // step) # jumlah langkah S sampai ujung grid
+    deltas = np.arange(-reach, reach + 1)
+    while True:
+        table = peak_phase_table(n, count, step / interp, deltas)
+        values = (centred @ table.T).real
+        candidates = best[..., None] + deltas * step
+        values = np.where(np.abs(candidates) <= interp, values, -np.inf)
+        choice = np.argmax(values, axis=-1)
+        best = np.take_along_axis(candidates, choice[..., None], axis=-1)[..., 0]
+        if step == 1:
+            return best / interp
+        centred = centred * table[choice] # pusat evaluasi pindah ke titik terbaik
+        step = -(-step // 4)
+        deltas = np.arange(-2, 3)
+
+def shift_half(x, core_ndim):
+    """Menggeser sumbu terakhir sejauh n/2 (spline order 5, grid-wrap), per file bila bertumpuk."""
+    # Untuk n genap pergeserannya bilangan bulat; spline interpolasi melewati titik
+    # sampel sehingga hasilnya sama dengan rotasi indeks (np.roll) tanpa galat spline.
+    # n ganjil tetap memakai spline. scipy.ndimage.shift pada array bertumpuk ikut
+    # menginterpolasi sumbu file, jadi tiap file digeser sendiri.
+    if x.shape[-1] % 2 == 0:
+        return np.roll(x, x.shape[-1] // 2, axis=-1)
+    shift = (0,) * (core_ndim - 1) + (x.shape[-1]/2,)
+    if x.ndim == core_ndim:
+        return scipy.ndimage.shift(x, shift, mode="grid-wrap", order = 5)
+    items = x.reshape((-1,) + x.shape[-core_ndim:])
+    shifted = [scipy.ndimage.shift(item, shift, mode="grid-wrap", order = 5) for item in items]
+    return np.stack(shifted).reshape(x.shape)
+
+def interp_timestamp(timestamp, position) -> np.ndarray:
+    """Timestamp pada posisi sampel pecahan (interpolasi linear, dijepit di ujung seperti np.interp)."""
+    position = np.clip(position, 0, timestamp.shape[-1] - 1)
+    left = np.minimum(np.floor(position).astype(np.int64), timestamp.shape[-1] - 2)
+    start = np.take_along_axis(timestamp, left, axis=-1)
+    end = np.take_along_axis(timestamp, left + 1, axis=-1)
+    return start + (position - left) * (end - start)
+
+GCC_WEIGHTINGS = ("CC", "PHAT", "SCOT", "ROTH")
+
+def gcc_weight(R, magnitudes, ref_magnitudes, weighting):
+    """Bobot frekuensi GCC untuk cross-spectrum R (seperti CCType di TerawangCC.gcc)."""
+    # Tanpa perataan spektrum antar segmen, |SIG|*|REFSIG| = |R| sehingga SCOT
+    # memberi hasil yang sama dengan PHAT; tetap disediakan agar bisa dibandingkan.
+    if weighting == "CC":
+        return 1
+    if weighting == "PHAT":
+        return 1 / (np.abs(R) + 1e-10)
+    if weighting == "SCOT":
+        return 1 / (magnitudes * ref_magnitudes + 1e-10)
+    if weighting == "ROTH":
+        return 1 / (magnitudes ** 2 + 1e-10)
+    raise ValueError(f"Pembobotan GCC tidak dikenal: {weighting}")
+
+def gcc_batch(spectrum, ref_index, fs=1000000, max_tau=None, interp=128, timestamp=None, tau_bounds=None,
+              refine=None, weighting="PHAT") -> np.ndarray:
+    """Menghitung GCC satu kanal referensi terhadap semua kanal sekaligus."""
+    
+    # Versi batch dari gcc(): memakai rfft semua kanal dari SigSpectrum, cross-spectrum
+    # terhadap kanal referensi lewat broadcasting, lalu satu irfft batch.
+    # Hasilnya tau per kanal. Untuk SigSpectrum bertumpuk, ref_index dan timestamp
+    # berisi satu nilai/baris per file dan hasilnya (file x kanal).
+    # weighting berupa tuple (mis. GCC_WEIGHTINGS) menghitung semua pembobotan dari
+    # cross-spectrum yang sama dalam satu irfft; hasilnya (pembobotan x ... x kanal).
+    n = spectrum.n
+    
+    SIGS = spectrum.spectra
+    ref_index = np.reshape(ref_index, np.shape(ref_index) + (1, 1))
+    R = SIGS * np.conj(np.take_along_axis(SIGS, ref_index, axis=-2))
+    
+    ref_magnitudes = np.take_along_axis(spectrum.magnitudes, ref_index, axis=-2)
+    if isinstance(weighting, str):
+        integ = R * gcc_weight(R, spectrum.magnitudes, ref_magnitudes, weighting) # PHAT = gcc()
+    else:
+        integ = np.stack([R * gcc_weight(R, spectrum.magnitudes, ref_magnitudes, w) for w in weighting])
+    
+    # timestamp boleh array atau TimingContext; spectrum.timestamp memakai spectrum.timing yang sudah ada
+    timing = timing_context(timestamp, spectrum)
+    
+    max_shift = int(n / 2)
+    
+    if max_tau:
+        max_shift = min(int(fs * max_tau), max_shift)
+    
+    if tau_bounds is not None:
+        return gcc_batch_bounded(integ, n, max_shift, fs, interp, timing, tau_bounds, refine)
+    
+    cc = np.fft.irfft(integ, axis=-1, n=n)
+
+    # Indeks jendela smallcc dibentuk dengan slicing yang sama seperti gcc()
+    window = np.arange(n)
+    window = np.concatenate((window[-max_shift:], window[:max_shift+1]))
+    smallcc = cc[..., window] / np.max(cc, axis=-1, keepdims=True)
+    
+    peak = np.argmax(smallcc, axis=-1)
+    shift = peak - max_shift
+    if refine and timing is None:
+        shift = shift + refine_peak(integ, n, window[peak], refine, interp)
+    tau = shift / float(fs)
+    
+    if timing is not None:
+        tau = timestamp_tau(cc, integ, n, timing, max_shift, refine, interp)
+
+    tau = tau / 10
+    
+    return np.abs(tau)
+
+def timestamp_tau(cc, integ, n, timing, max_shift, refine=None, interp=128) -> np.ndarray:
+    """tau bertanda (detik, sebelum /10) dari cc mentah lewat timestamp puncak, jalur timestamp gcc()."""
+    cc = shift_half(cc, 2)
+    cc /= np.max(cc, axis=-1, keepdims=True)
+    peak = np.argmax(cc, axis=-1)
+    if refine:
+        peak = peak + refine_peak(integ, n, peak - n / 2, refine, interp)
+    peaktimestamp = timing.at(peak)
+    
+    tau = timing.tau(peaktimestamp, max_shift)
+    return (tau if refine else tau.astype(np.int64)) / 1000000 # convert to seconds
+
+def gcc_batch_bounded(integ, n, max_shift, fs, interp, timing, tau_bounds, refine=None) -> np.ndarray:
+    """Puncak GCC-PHAT per kanal yang dicari hanya pada posisi dengan tau di dalam tau_bounds."""
+    
+    # tau tiap posisi pencarian dihitung dengan rumus yang sama seperti gcc_batch(),
+    # lalu posisi di luar (tau_min, tau_max) kanal tersebut diabaikan. Bila jendela
+    # sempit, cc cukup dievaluasi langsung pada posisi itu tanpa irfft penuh.
+    # Kanal tanpa posisi yang valid mendapat tau = inf (kecepatan 0).
+    if timing is not None:
+        # Posisi = indeks cc yang sudah digeser n/2, seperti jalur timestamp gcc_batch()
+        tau_axis = timing.lag_tau(max_shift)
+        # Pergeseran n/2 hanya berupa rotasi indeks bila n genap
+        raw_index = (np.arange(n) - n // 2) % n if n % 2 == 0 else None
+    else:
+        # Posisi = indeks smallcc, lag = posisi - max_shift
+        window = np.arange(n)
+        raw_index = np.concatenate((window[-max_shift:], window[:max_shift+1]))
+        tau_axis = (np.arange(len(raw_index)) - max_shift) / float(fs)
+    tau_axis = np.abs(tau_axis / 10)
+    
+    # allowed: (... x kanal x posisi); tau_axis per file bila timestamp bertumpuk
+    tau_min, tau_max = (np.expand_dims(bound, -1) for bound in tau_bounds)
+    tau_axis = np.expand_dims(tau_axis, -2)
+    allowed = (tau_axis >= tau_min) & (tau_axis <= tau_max)
+    allowed = np.broadcast_to(allowed, integ.shape[:-1] + allowed.shape[-1:])
+    positions = np.flatnonzero(allowed.reshape(-1, allowed.shape[-1]).any(axis=0))
+    
+    tau = np.full(integ.shape[:-1], np.inf)
+    if not len(positions):
+        return tau
+    
+    if raw_index is not None and len(positions) <= DIRECT_CC_MAX_LAGS:
+        cc = direct_cc(integ, n, raw_index[positions])
+    else:
+        cc = np.fft.irfft(integ, axis=-1, n=n)
+        if raw_index is not None:
+            cc = cc[..., raw_index[positions]]
+        else:
+            cc = shift_half(cc, 2)[..., positions]
+    
+    cc = np.where(allowed[..., positions], cc, -np.inf)
+    found = allowed[..., positions].any(axis=-1)
+    peak = positions[np.argmax(cc, axis=-1)]
+    tau_peak = np.take_along_axis(np.broadcast_to(tau_axis, allowed.shape), peak[..., None], axis=-1)[..., 0]
+    if refine:
+        if timing is not None:
+            refined = peak + refine_peak(integ, n, peak - n / 2, refine, interp)
+            tau_refined = timing.tau(timing.at(refined), max_shift) / 1000000
+        else:
+            tau_refined = (peak - max_shift + refine_peak(integ, n, raw_index[peak], refine, interp)) / float(fs)
+        tau_refined = np.abs(tau_refined / 10)
+        # Geseran sub-sampel bisa melewati titik cermin a/b/c timestamp sehingga tau
+        # melompat jauh keluar jendela; saat itu tau puncak sampel bulat yang dipakai.
+        inside = (tau_refined >= tau_min[..., 0]) & (tau_refined <= tau_max[..., 0])
+        tau_peak = np.where(inside, tau_refined, tau_peak)
+    tau[found] = tau_peak[found]
+    return tau
+
+TDOA_PAIRS = np.triu_indices(8, k=1) # 28 pasangan kanal unik (i < j)
+
+def tdoa_matrix(spectrum, fs=1000000, interp=128, refine=None) -> np.ndarray:
+    """Matriks TDOA 8x8 semua pasangan kanal dari SigSpectrum yang sudah ada (detik)."""
+    
+    # tdoa[i, j] adalah tau bertanda kanal i terhadap referensi j dengan rumus yang
+    # sama seperti gcc_batch(ref=j), sehingga |tdoa[..., k, r]| = gcc_batch(ref=r)[k]
+    # (= ToF yang dipakai onetap). Hanya 28 pasangan i < j yang di-irfft (satu irfft
+    # batch); arah sebaliknya memakai cc yang dibalik (cc_ji[m] = cc_ij[-m]).
+    #   Tanpa timestamp: tau = lag / fs / 10, matriks antisimetris (tdoa[j, i] = -tdoa[i, j]).
+    #   Dengan timestamp: lag dipetakan lewat timestamp puncak seperti gcc(); lag di atas
+    #   n/2 tercermin, jadi matriks TIDAK antisimetris dan bukan selisih waktu tiba linear.
+    # Untuk SigSpectrum bertumpuk hasilnya (file x 8 x 8).
+    n = spectrum.n
+    first, second = TDOA_PAIRS
+    
+    R = spectrum.spectra[..., first, :] * np.conj(spectrum.spectra[..., second, :])
+    integ = R * gcc_weight(R, None, None, "PHAT") # sama dengan gcc_batch()
+    cc = np.fft.irfft(integ, axis=-1, n=n)
+    
+    max_shift = int(n / 2)
+    timing = spectrum.timing
+    tdoa = np.zeros(cc.shape[:-2] + (8, 8))
+    if timing is not None:
+        reverse = -np.arange(n) % n
+        tdoa[..., first, second] = timestamp_tau(cc, integ, n, timing, max_shift, refine, interp) / 10
+        tdoa[..., second, first] = timestamp_tau(cc[..., reverse], np.conj(integ), n, timing, max_shift,
+                                                 refine, interp) / 10
+        return tdoa
+    
+    window = np.arange(n)
+    window = np.concatenate((window[-max_shift:], window[:max_shift+1]))
+    peak = np.argmax(cc[..., window], axis=-1)
+    shift = (peak - max_shift).astype(np.float64)
+    if refine:
+        shift = shift + refine_peak(integ, n, window[peak], refine, interp)
+    tau = shift / float(fs) / 10
+    
+    tdoa[..., first, second] = tau
+    tdoa[..., second, first] = -tau
+    return tdoa
 
-def onetap(sigarray: np.ndarray, which: int, diameter: float) -> np.ndarray:
+def tdoa_closure_residual(tdoa) -> np.ndarray:
+    """Selisih terbesar |tdoa[i,j] + tdoa[j,k] + tdoa[k,i]| per ketukan; 0 bila semua pasangan konsisten."""
+    # Hanya bermakna untuk tdoa_matrix() tanpa timestamp (selisih waktu tiba linear)
+    residual = tdoa[..., :, :, None] + tdoa[..., None, :, :] + np.swapaxes(tdoa, -1, -2)[..., :, None, :]
+    return np.abs(residual).max(axis=(-3, -2, -1))
+
+def onetap(sigarray, which: int, diameter: float) -> np.ndarray:
     """Menghitung kecepatan dari satu set data ketukan."""
     
     # function to tap once. produces 7 ToF/tau from 7 CC, out of 8 sensors
     
     # diameters in meters
     
-    sig1 = sigarray["value1"]
-    sig2 = sigarray["value2"]
-    sig3 = sigarray["value3"]
-    sig4 = sigarray["value4"]
-    sig5 = sigarray["value5"]
-    sig6 = sigarray["value6"]
-    sig7 = sigarray["value7"]
-    sig8 = sigarray["value8"]
-    timestamp = sigarray["timestamp"]
-    
-    radius = diameter/2
-    ab = radius * 0.76536686473 # sqrt(sqrt(2)-2)
-    ac = radius * 1.41421356237 # sqrt(2)
-    ad = radius * 1.84775906502 # sqrt(sqrt(2)+2)
-    ae = float(diameter)
+    # sigarray boleh berupa SensorCapture, array lama (samples x 9) atau SigSpectrum yang sudah dihitung.
+    # Untuk SigSpectrum bertumpuk, which berisi nomor sensor tiap file dan hasilnya (file x 8).
+    if isinstance(sigarray, SigSpectrum):
+        spectrum = sigarray
+    else:
+        spectrum = SigSpectrum(sigarray)
     
+    # chords = (0, ab, ac, ad, ae), dihitung sekali per diameter (lru_cache di memori)
     # ab = 12,23,34,45,56,67,78,81
     # ac = 13,24,35,46,57,68,71,82
     # ad = 14,25,36,47,58,61,72,83
     # ae = 15,26,37,48,51,62,73,84
+    chords = chord_lengths(diameter)
     
+    which = np.asarray(which)
     try:
-        match which:
-            case 1:
-                tof12 = gcc(refsig=sig1, sig=sig2, timestamp=timestamp)[0]
-                tof13 = gcc(refsig=sig1, sig=sig3, timestamp=timestamp)[0]
-                tof14 = gcc(refsig=sig1, sig=sig4, timestamp=timestamp)[0]
-                tof15 = gcc(refsig=sig1, sig=sig5, timestamp=timestamp)[0]
-                tof16 = gcc(refsig=sig1, sig=sig6, timestamp=timestamp)[0]
-                tof17 = gcc(refsig=sig1, sig=sig7, timestamp=timestamp)[0]
-                tof18 = gcc(refsig=sig1, sig=sig8, timestamp=timestamp)[0]
-                velo12 = ab / tof12
-                velo13 = ac / tof13
-                velo14 = ad / tof14
-                velo15 = ae / tof15
-                velo16 = ad / tof16
-                velo17 = ac / tof17
-                velo18 = ab / tof18
-            
-                return np.array((0, velo12, velo13, velo14, velo15, velo16, velo17, velo18), dtype=np.float32)
-            case 2:
-                tof21 = gcc(refsig=sig2, sig=sig1, timestamp=timestamp)[0]
-                tof23 = gcc(refsig=sig2, sig=sig3, timestamp=timestamp)[0]
-                tof24 = gcc(refsig=sig2, sig=sig4, timestamp=timestamp)[0]
-                tof25 = gcc(refsig=sig2, sig=sig5, timestamp=timestamp)[0]
-                tof26 = gcc(refsig=sig2, sig=sig6, timestamp=timestamp)[0]
-                tof27 = gcc(refsig=sig2, sig=sig7, timestamp=timestamp)[0]
-                tof28 = gcc(refsig=sig2, sig=sig8, timestamp=timestamp)[0]
-                velo21 = ab / tof21
-                velo23 = ab / tof23
-                velo24 = ac / tof24
-                velo25 = ad / tof25
-                velo26 = ae / tof26
-                velo27 = ad / tof27
-                velo28 = ac / tof28
-            
-                return np.array((velo21, 0, velo23, velo24, velo25, velo26, velo27, velo28), dtype=np.float32)
-            case 3:
-                tof31 = gcc(refsig=sig3, sig=sig1, timestamp=timestamp)[0]
-                tof32 = gcc(refsig=sig3, sig=sig2, timestamp=timestamp)[0]
-                tof34 = gcc(refsig=sig3, sig=sig4, timestamp=timestamp)[0]
-                tof35 = gcc(refsig=sig3, sig=sig5, timestamp=timestamp)[0]
-                tof36 = gcc(refsig=sig3, sig=sig6, timestamp=timestamp)[0]
-                tof37 = gcc(refsig=sig3, sig=sig7, timestamp=timestamp)[0]
-                tof38 = gcc(refsig=sig3, sig=sig8, timestamp=timestamp)[0]
-                velo31 = ac / tof31
-                velo32 = ab / tof32
-                velo34 = ab / tof34
-                velo35 = ac / tof35
-                velo36 = ad / tof36
-                velo37 = ae / tof37
-                velo38 = ad / tof38
-            
-                return np.array((velo31, velo32, 0, velo34, velo35, velo36, velo37, velo38), dtype=np.float32) 
-            case 4:
-                tof41 = gcc(refsig=sig4, sig=sig1, timestamp=timestamp)[0]
-                tof42 = gcc(refsig=sig4, sig=sig2, timestamp=timestamp)[0]
-                tof43 = gcc(refsig=sig4, sig=sig3, timestamp=timestamp)[0]
-                tof45 = gcc(refsig=sig4, sig=sig5, timestamp=timestamp)[0]
-                tof46 = gcc(refsig=sig4, sig=sig6, timestamp=timestamp)[0]
-                tof47 = gcc(refsig=sig4, sig=sig7, timestamp=timestamp)[0]
-                tof48 = gcc(refsig=sig4, sig=sig8, timestamp=timestamp)[0]
-                velo41 = ad / tof41
-                velo42 = ac / tof42
-                velo43 = ab / tof43
-                velo45 = ab / tof45
-                velo46 = ac / tof46
-                velo47 = ad / tof47
-                velo48 = ae / tof48
-            
-                return np.array((velo41, velo42, velo43, 0, velo45, velo46, velo47, velo48), dtype=np.float32)
-            case 5:
-                tof51 = gcc(refsig=sig5, sig=sig1, timestamp=timestamp)[0]
-                tof52 = gcc(refsig=sig5, sig=sig2, timestamp=timestamp)[0]
-                tof53 = gcc(refsig=sig5, sig=sig3, timestamp=timestamp)[0]
-                tof54 = gcc(refsig=sig5, sig=sig4, timestamp=timestamp)[0]
-                tof56 = gcc(refsig=sig5, sig=sig6, timestamp=timestamp)[0]
-                tof57 = gcc(refsig=sig5, sig=sig7, timestamp=timestamp)[0]
-                tof58 = gcc(refsig=sig5, sig=sig8, timestamp=timestamp)[0]
-                velo51 = ae / tof51
-                velo52 = ad / tof52
-                velo53 = ac / tof53
-                velo54 = ab / tof54
-                velo56 = ab / tof56
-                velo57 = ac / tof57
-                velo58 = ad / tof58
-            
-                return np.array((velo51, velo52, velo53, velo54, 0, velo56, velo57, velo58), dtype=np.float32)
-            case 6:
-                tof61 = gcc(refsig=sig6, sig=sig1, timestamp=timestamp)[0]
-                tof62 = gcc(refsig=sig6, sig=sig2, timestamp=timestamp)[0]
-                tof63 = gcc(refsig=sig6, sig=sig3, timestamp=timestamp)[0]
-                tof64 = gcc(refsig=sig6, sig=sig4, timestamp=timestamp)[0]
-                tof65 = gcc(refsig=sig6, sig=sig5, timestamp=timestamp)[0]
-                tof67 = gcc(refsig=sig6, sig=sig7, timestamp=timestamp)[0]
-                tof68 = gcc(refsig=sig6, sig=sig8, timestamp=timestamp)[0]
-                velo61 = ad / tof61
-                velo62 = ae / tof62
-                velo63 = ad / tof63
-                velo64 = ac / tof64
-                velo65 = ab / tof65
-                velo67 = ab / tof67
-                velo68 = ac / tof68
-            
-                return np.array((velo61, velo62, velo63, velo64, velo65, 0, velo67, velo68), dtype=np.float32)
-            case 7:
-                tof71 = gcc(refsig=sig7, sig=sig1, timestamp=timestamp)[0]
-                tof72 = gcc(refsig=sig7, sig=sig2, timestamp=timestamp)[0]
-                tof73 = gcc(refsig=sig7, sig=sig3, timestamp=timestamp)[0]
-                tof74 = gcc(refsig=sig7, sig=sig4, timestamp=timestamp)[0]
-                tof75 = gcc(refsig=sig7, sig=sig5, timestamp=timestamp)[0]
-                tof76 = gcc(refsig=sig7, sig=sig6, timestamp=timestamp)[0]
-                tof78 = gcc(refsig=sig7, sig=sig8, timestamp=timestamp)[0]
-                velo71 = ac / tof71
-                velo72 = ad / tof72
-                velo73 = ae / tof73
-                velo74 = ad / tof74
-                velo75 = ac / tof75
-                velo76 = ab / tof76
-                velo78 = ab / tof78
-            
-                return np.array((velo71, velo72, velo73, velo74, velo75, velo76, 0, velo78), dtype=np.float32)
-            case 8:
-                tof81 = gcc(refsig=sig8, sig=sig1, timestamp=timestamp)[0]
-                tof82 = gcc(refsig=sig8, sig=sig2, timestamp=timestamp)[0]
-                tof83 = gcc(refsig=sig8, sig=sig3, timestamp=timestamp)[0]
-                tof84 = gcc(refsig=sig8, sig=sig4, timestamp=timestamp)[0]
-                tof85 = gcc(refsig=sig8, sig=sig5, timestamp=timestamp)[0]
-                tof86 = gcc(refsig=sig8, sig=sig6, timestamp=timestamp)[0]
-                tof87 = gcc(refsig=sig8, sig=sig7, timestamp=timestamp)[0]
-                velo81 = ab / tof81
-                velo82 = ac / tof82
-                velo83 = ad / tof83
-                velo84 = ae / tof84
-                velo85 = ad / tof85
-                velo86 = ac / tof86
-                velo87 = ab / tof87
-            
-                return np.array((velo81, velo82, velo83, velo84, velo85, velo86, velo87, 0), dtype=np.float32)
-            case _:
-                raise ValueError("Invalid number. Expected between 1 and 8")
+        if np.any((which < 1) | (which > 8)):
+            raise ValueError("Invalid number. Expected between 1 and 8")
+        
+        offsets = np.arange(8) - (which[..., None] - 1)
+        others = offsets != 0
+        steps = np.abs(offsets)
+        steps = np.minimum(steps, 8 - steps)
+        
+        # Jendela tau tiap kanal dari panjang chord dan rentang kecepatan
+        tau_bounds = None
+        if VELOCITY_MAX > 0:
+            tau_max = chords[steps] / VELOCITY_MIN if VELOCITY_MIN > 0 else np.full(steps.shape, np.inf)
+            tau_bounds = (chords[steps] / VELOCITY_MAX, tau_max)
+        
+        weighting = GCC_WEIGHTING[0] if len(GCC_WEIGHTING) == 1 else GCC_WEIGHTING
+        tof = gcc_batch(spectrum, which - 1, timestamp=spectrum.timestamp, tau_bounds=tau_bounds,
+                        refine=PEAK_REFINEMENT or None, weighting=weighting)
+        if tof.ndim > steps.ndim:
+            tof = np.median(tof, axis=0) # ensemble: median tau antar pembobotan
+        velo = np.zeros(steps.shape)
+        np.divide(chords[steps], tof, out=velo, where=others)
+        
+        return velo.astype(np.float32)
     except ValueError as ve:
         print(f"Error saat menghitung ToF: {ve}")
-        return np.zeros(8, dtype=np.float32)
+        return np.zeros(np.shape(which) + (8,), dtype=np.float32)
 
 # =============================================================================
 # FUNGSI UTAMA UNTUK ORKESTRASI PEMROSESAN
 # =============================================================================
-def process_batch(file_paths, diameter):
-    """Memproses satu batch (8 file) dan mengembalikan matriks kecepatan."""
-    all_velocity_rows = []
+rabbitmq_publisher = None # Dibuat saat publikasi pertama, lihat get_rabbitmq_publisher()
+rabbitmq_publisher_lock = threading.Lock()
+# Naikkan setiap kali perubahan onetap()/gcc_batch()/parser mengubah hasil baris,
+# agar baris lama di cache (termasuk yang tersimpan di disk) tidak dipakai lagi
+ROW_ALGORITHM_VERSION = 3
+row_cache = None # Dibuat saat batch pertama, lihat get_row_cache()
+row_cache_lock = threading.Lock()
+geometry_cache = None # Dibuat saat pertama dipakai, lihat get_geometry_cache()
+geometry_cache_lock = threading.Lock()
+process_pool = None # Dibuat saat batch paralel pertama, lihat get_process_pool()
+process_pool_workers = 0
+process_pool_lock = threading.Lock()
+
+def process_row(filepath, which, diameter, data=None, tdoa=False):
+    """Memproses satu file ketukan menjadi satu baris kecepatan (dan matriks TDOA 8x8 bila tdoa=True)."""
+    capture = load_sigarray_from_json(filepath, data=data)
+    if capture is None:
+        print(f"Gagal memproses {filepath}, baris akan diisi nol.")
+        row = np.zeros(8, dtype=np.float32)
+        return (row, np.zeros((8, 8))) if tdoa else row
+    spectrum = SigSpectrum(capture)
+    row = onetap(spectrum, which=which, diameter=diameter)
+    if tdoa:
+        # Spektrum yang sama dipakai ulang: hanya satu irfft batch tambahan
+        return row, tdoa_matrix(spectrum, refine=PEAK_REFINEMENT or None)
+    return row
+
+def process_batch(file_paths, diameter, workers=None, contents=None, tdoa=False, cached_rows=None):
+    """Memproses satu batch (8 file) dan mengembalikan matriks kecepatan (dan TDOA 8x8x8 bila tdoa=True)."""
+    # contents (opsional) berisi nama file -> bytes untuk ingest tanpa menulis ke disk.
+    # cached_rows (opsional) adalah hasil lookup_cached_rows() dari pemanggil; bila
+    # diisi, cache baris tidak disentuh di sini (mis. di proses worker pipeline_async).
     sorted_paths = sorted(file_paths)
-    for i, filepath in enumerate(sorted_paths, start=1):
-        sigarray = load_sigarray_from_json(filepath)
-        if sigarray is not None:
-            velocity_row = onetap(sigarray, which=i, diameter=diameter)
-            all_velocity_rows.append(velocity_row)
-        else:
-            print(f"Gagal memproses {filepath}, baris akan diisi nol.")
-            all_velocity_rows.append(np.zeros(8, dtype=np.float32))
-            continue        
+    whiches = range(1, len(sorted_paths) + 1)
+    datas = [contents.get(path) if contents else None for path in sorted_paths]
+    
+    # Baris yang isi filenya sudah pernah dihitung diambil dari cache,
+    # sehingga ketukan ulang satu sensor hanya menghitung ulang baris itu.
+    cache = get_row_cache() if cached_rows is None else None
+    all_velocity_rows = list(cached_rows) if cached_rows is not None else [None] * len(sorted_paths)
+    keys = [None] * len(sorted_paths)
+    if cache is not None:
+        for i, (filepath, data) in enumerate(zip(sorted_paths, datas)):
+            if data is None:
+                with open(filepath, 'rb') as f:
+                    datas[i] = data = f.read()
+            keys[i] = cache.key(data, i + 1, diameter)
+            # Cache hanya berisi baris kecepatan; matriks TDOA butuh spektrum, jadi semua baris dihitung
+            if not tdoa:
+                all_velocity_rows[i] = cache.get(keys[i])
+    todo = [i for i, row in enumerate(all_velocity_rows) if row is None]
+    todo_args = ([sorted_paths[i] for i in todo], [whiches[i] for i in todo], [datas[i] for i in todo])
     
+    # Tiap baris independen, jadi bisa dihitung paralel di beberapa proses.
+    # pool.map mengembalikan hasil sesuai urutan input (urutan file terurut).
+    if workers and workers > 1 and len(todo) > 1:
+        pool = get_process_pool(workers)
+        try:
+            computed_rows = list(pool.map(process_row, todo_args[0], todo_args[1], repeat(diameter), todo_args[2],
+                                          repeat(tdoa)))
+        except BrokenProcessPool:
+            reset_process_pool(pool) # batch berikutnya memakai pool baru
+            raise
+    else:
+        computed_rows = [process_row(filepath, which, diameter, data, tdoa) for filepath, which, data in zip(*todo_args)]
+    if tdoa:
+        computed_rows, tdoa_matrices = zip(*computed_rows) if computed_rows else ((), ())
+    
+    for i, row in zip(todo, computed_rows):
+        all_velocity_rows[i] = row
+        if cache is not None:
+            cache.put(keys[i], row)
+    if cache is not None:
+        save_row_cache(cache, len(sorted_paths) - len(todo), len(sorted_paths))
+    
+    if tdoa:
+        return np.vstack(all_velocity_rows), np.stack(tdoa_matrices)
     return np.vstack(all_velocity_rows)
 
+def lookup_cached_rows(contents, diameter, tdoa=False):
+    """Baris cache untuk isi 8 file (urutan nama terurut seperti process_batch), None bila belum ada."""
+    # Dipakai proses induk pipeline_async: worker hanya menerima hasilnya lewat
+    # cached_rows sehingga cache baris (dan file-nya) hanya dipegang satu proses.
+    names = sorted(contents)
+    cache = get_row_cache()
+    if cache is None or tdoa:
+        return [None] * len(names)
+    return [cache.get(cache.key(contents[name], which, diameter)) for which, name in enumerate(names, 1)]
+
+def store_cached_rows(contents, diameter, velocity, cached_rows):
+    """Menyimpan baris yang baru dihitung (bukan dari cached_rows) ke cache baris lalu menulisnya ke disk."""
+    cache = get_row_cache()
+    if cache is None:
+        return
+    names = sorted(contents)
+    for which, (name, row, known) in enumerate(zip(names, velocity, cached_rows), 1):
+        if known is None:
+            cache.put(cache.key(contents[name], which, diameter), row)
+    save_row_cache(cache, sum(row is not None for row in cached_rows), len(names))
+
+def save_row_cache(cache, reused, total):
+    """Menulis cache baris ke disk dan mencetak statistiknya."""
+    cache.save()
+    stats = cache.stats()
+    print(f"Cache baris: {reused} dari {total} baris dipakai ulang "
+          f"(total {stats['hits']} hit, {stats['misses']} miss, {stats['entries']} baris tersimpan).")
+
+def get_row_cache():
+    """Mengembalikan cache baris bersama, atau None bila ROW_CACHE_PATH kosong."""
+    global row_cache
+    if not ROW_CACHE_PATH:
+        return None
+    with row_cache_lock:
+        if row_cache is None:
+            version = (f"v{ROW_ALGORITHM_VERSION}:{COMPUTE_DTYPE.name}:{VELOCITY_MIN:g}-{VELOCITY_MAX:g}"
+                       f":{PEAK_REFINEMENT}:{','.join(GCC_WEIGHTING)}")
+            row_cache = RowCache(ROW_CACHE_PATH, max_entries=ROW_CACHE_MAX_ENTRIES, version=version)
+        return row_cache
+
+def get_geometry_cache():
+    """Mengembalikan cache geometri bersama (matriks sistem tomografi)."""
+    global geometry_cache
+    with geometry_cache_lock:
+        if geometry_cache is None:
+            geometry_cache = GeometryCache(GEOMETRY_CACHE_DIR or None, max_entries=GEOMETRY_CACHE_MAX_ENTRIES)
+        return geometry_cache
+
+def get_process_pool(workers):
+    """Mengembalikan process pool bersama untuk menghitung baris paralel (dibuat sekali, dipakai ulang)."""
+    # Membuat pool baru tiap batch memakan puluhan ms (spawn proses dan import
+    # numpy/scipy di tiap proses), lebih lama dari menghitung batch itu sendiri.
+    global process_pool, process_pool_workers
+    with process_pool_lock:
+        if process_pool is not None and process_pool_workers != workers:
+            process_pool.shutdown(wait=False)
+            process_pool = None
+        if process_pool is None:
+            process_pool = ProcessPoolExecutor(max_workers=workers)
+            process_pool_workers = workers
+        return process_pool
+
+def reset_process_pool(pool=None):
+    """Menutup process pool bersama (mis. setelah proses worker mati) agar dibuat ulang saat dibutuhkan."""
+    global process_pool
+    with process_pool_lock:
+        if process_pool is not None and (pool is None or process_pool is pool):
+            process_pool.shutdown(wait=False)
+            process_pool = None
+
+def get_rabbitmq_publisher():
+    """Mengembalikan publisher RabbitMQ bersama (dibuat sekali, koneksi dipakai ulang)."""
+    global rabbitmq_publisher
+    with rabbitmq_publisher_lock:
+        if rabbitmq_publisher is None:
+            credentials = pika.PlainCredentials(RABBITMQ_USERNAME, RABBITMQ_PASSWORD)
+            parameters = pika.ConnectionParameters(
+                RABBITMQ_HOST, RABBITMQ_PORT, RABBITMQ_VHOST, credentials)
+            rabbitmq_publisher = RabbitMQPublisher(parameters, max_retries=RABBITMQ_PUBLISH_RETRIES)
+        return rabbitmq_publisher
+
 def publish_to_rabbitmq(message, queue_name):
     """Mempublikasikan pesan ke antrian RabbitMQ yang spesifik."""
-    try:
-        credentials = pika.PlainCredentials(RABBITMQ_USERNAME, RABBITMQ_PASSWORD)
-        parameters = pika.ConnectionParameters(
-            RABBITMQ_HOST, RABBITMQ_PORT, RABBITMQ_VHOST, credentials)
-        connection = pika.BlockingConnection(parameters)
-        channel = connection.channel()
-        channel.queue_declare(queue=queue_name, durable=False)
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=message,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        connection.close()
+    if get_rabbitmq_publisher().publish(message, queue_name):
         print(f"Berhasil mempublikasikan pesan ke antrian '{queue_name}'.")
         return True
-    except Exception as e:
-        print(f"Error saat publikasi ke antrian '{queue_name}': {e}")
-        return False
+    print(f"Gagal mempublikasikan pesan ke antrian '{queue_name}'.")
+    return False
 
 def parse_filename(filename):
     """Mengekstrak informasi dari nama file."""
@@ -374,10 +926,10 @@ def parse_filename(filename):
     except (IndexError, ValueError):
         return None
 
-def upload_to_ftp(ftp, local_path, remote_filename, remote_folder):
-    """Mengunggah satu file ke folder spesifik di server FTP menggunakan koneksi yang ada."""
+def upload_to_ftp(ftp, local_path, remote_filename, remote_folder, data=None):
+    """Mengunggah satu file (atau isi file di memori) ke folder spesifik di server FTP menggunakan koneksi yang ada."""
     try:
-        with open(local_path, 'rb') as f:
+        with (io.BytesIO(data) if data is not None else open(local_path, 'rb')) as f:
             # Pastikan direktori tujuan ada
             try:
                 ftp.mkd(remote_folder)
@@ -391,105 +943,377 @@ def upload_to_ftp(ftp, local_path, remote_filename, remote_folder):
         print(f"Error saat mengunggah '{remote_filename}' ke FTP: {e}")
         return False
 
+def archive_on_ftp(ftp, contents, source_folder, archive_folder):
+    """Memindahkan file sumber ke folder arsip di sisi server (RNFR/RNTO), unggah ulang bila gagal."""
+    # Error per file hanya dicatat: hasil batch sudah terkirim, jadi batch tidak
+    # boleh dianggap gagal karena arsip. Mengembalikan file yang tidak terarsip.
+    try:
+        ftp.mkd(archive_folder)
+    except Exception:
+        pass
+    failed = []
+    for fname, data in contents.items():
+        try:
+            ftp.rename(posixpath.join(source_folder, fname), posixpath.join(archive_folder, fname))
+            continue
+        except all_errors as e:
+            print(f"Rename '{fname}' di FTP gagal ({e}), beralih ke unggah ulang lalu hapus.")
+        # Fallback: misalnya folder arsip ada di filesystem lain
+        try:
+            if upload_to_ftp(ftp, None, fname, archive_folder, data=data):
+                ftp.cwd(source_folder)
+                ftp.delete(fname)
+                continue
+        except all_errors as e:
+            print(f"Error saat menghapus '{fname}' dari '{source_folder}' setelah diunggah ulang: {e}")
+        failed.append(fname)
+    if failed:
+        print(f"{len(failed)} file sumber tidak terarsip dan tetap di '{source_folder}': {', '.join(failed)}")
+    return failed
+
+def archive_local_sources(ftp, contents, source_dir, archive_folder):
+    """Mengunggah file sumber lokal ke folder arsip FTP lalu menghapusnya dari folder pantauan."""
+    failed = []
+    for fname, data in contents.items():
+        try:
+            if upload_to_ftp(ftp, None, fname, archive_folder, data=data):
+                os.remove(os.path.join(source_dir, fname))
+                continue
+        except OSError as e:
+            print(f"Error saat menghapus '{fname}' dari '{source_dir}': {e}")
+        failed.append(fname)
+    if failed:
+        print(f"{len(failed)} file sumber tidak terarsip dan tetap di '{source_dir}': {', '.join(failed)}")
+    return failed
+
+def collect_ready_batches(assembler, filenames):
+    """Memasukkan file baru ke BatchAssembler dan mengembalikan batch yang sudah lengkap."""
+    parsed_infos = [info for info in map(parse_filename, filenames) if info]
+    ready_batches = assembler.add_many(parsed_infos)
+    for window in ready_batches:
+        time_diff = window[-1]['timestamp'] - window[0]['timestamp']
+        print(f"Batch valid ditemukan untuk GUID {window[0]['guid']} dengan rentang waktu {time_diff} detik.")
+    return ready_batches
+
+def encode_result_message(guid_survey, result_filename, velo_list, source_files, tdoa_list=None, image=None):
+    """Menyusun pesan hasil dengan matriks kecepatan inline (float32 little-endian, base64)."""
+    velo_matrix = np.asarray(velo_list, dtype='<f4')
+    message = {
+        "GUID_SURVEY": guid_survey,
+        "result_filename": result_filename,
+        "data": source_files,
+        "shape": list(velo_matrix.shape),
+        "dtype": velo_matrix.dtype.str,
+        "velocity": base64.b64encode(velo_matrix.tobytes()).decode('ascii'),
+    }
+    if tdoa_list is not None:
+        # TDOA (ketukan x 8 x 8) dalam float64 karena nilainya orde mikrodetik
+        tdoa = np.asarray(tdoa_list, dtype='<f8')
+        message.update({"tdoa_shape": list(tdoa.shape), "tdoa_dtype": tdoa.dtype.str,
+                        "tdoa": base64.b64encode(tdoa.tobytes()).decode('ascii')})
+    if image is not None:
+        image = np.asarray(image, dtype='<f4')
+        message.update({"image_shape": list(image.shape), "image_dtype": image.dtype.str,
+                        "image": base64.b64encode(image.tobytes()).decode('ascii')})
+    return json.dumps(message, separators=(',', ':'))
+
+def fetch_batch(ftp_pool, window):
+    """Tahap unduh: mengambil 8 file satu batch ke memori."""
+    # Ambil file batch langsung ke memori, paralel lewat beberapa sesi pool
+    filenames_to_process = [f['filename'] for f in window]
+    contents = ftp_pool.fetch_many(filenames_to_process, retries=FTP_DOWNLOAD_RETRIES)
+    print(f"Berhasil mengunduh {len(contents)} file ke memori.")
+    save_raw_archive(contents)
+    return contents
+
+def read_local_batch(source_dir, window):
+    """Tahap unduh untuk mode lokal: membaca 8 file batch dari folder pantauan."""
+    contents = {}
+    for f in window:
+        with open(os.path.join(source_dir, f['filename']), 'rb') as f_local:
+            contents[f['filename']] = f_local.read()
+    print(f"Berhasil membaca {len(contents)} file dari '{source_dir}'.")
+    save_raw_archive(contents)
+    return contents
+
+def save_raw_archive(contents):
+    """Menyimpan salinan file mentah bila arsip lokal diaktifkan."""
+    if LOCAL_RAW_ARCHIVE_DIR:
+        for fname, data in contents.items():
+            with open(os.path.join(LOCAL_RAW_ARCHIVE_DIR, fname), 'wb') as f_local:
+                f_local.write(data)
+        print(f"Salinan {len(contents)} file mentah disimpan ke '{LOCAL_RAW_ARCHIVE_DIR}'.")
+
+class BatchResult(NamedTuple):
+    """Hasil tahap hitung satu batch: matriks kecepatan dan keluaran opsional."""
+    velocity: list # 8x8
+    tdoa: Optional[list] = None # ketukan x 8 x 8 (TDOA_MATRIX=1)
+    image: Optional[list] = None # grid x grid (TOMOGRAPHY_GRID > 0)
+
+def compute_batch(contents, workers=None, cached_rows=None):
+    """Tahap hitung: mengubah isi 8 file menjadi BatchResult (matriks kecepatan 8x8 dan keluaran opsional)."""
+    # cached_rows: lihat process_batch()
+    tdoa = None
+    if TDOA_MATRIX:
+        velo_matrix, tdoa = process_batch(list(contents), DIAMETER, workers=workers, contents=contents, tdoa=True,
+                                          cached_rows=cached_rows)
+        tdoa = tdoa.tolist()
+    else:
+        velo_matrix = process_batch(list(contents), DIAMETER, workers=workers, contents=contents,
+                                    cached_rows=cached_rows)
+    velo_list = np.nan_to_num(velo_matrix, posinf=0).tolist()
+    return BatchResult(velo_list, tdoa, reconstruct_image(velo_list))
+
+def reconstruct_image(velo_list):
+    """Tahap tomografi: citra kecepatan grid x grid dari matriks 8x8, atau None bila nonaktif."""
+    if TOMOGRAPHY_GRID <= 0:
+        return None
+    system = get_geometry_cache().system_matrix(TOMOGRAPHY_GRID, DIAMETER)
+    image = tomography.reconstruct(velo_list, DIAMETER, grid=TOMOGRAPHY_GRID, method=TOMOGRAPHY_METHOD,
+                                   iterations=TOMOGRAPHY_ITERATIONS, system=system)
+    return image.tolist()
+
+def save_side_result(ftp_pool, filename, payload):
+    """Menyimpan keluaran tambahan batch (TDOA, citra tomografi) sebagai file JSON di samping file hasil."""
+    local_path = os.path.join(LOCAL_TEMP_DIR, filename)
+    with codecs.open(local_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    
+    if RESULT_FTP_ARCHIVE:
+        with ftp_pool.session() as ftp:
+            upload_to_ftp(ftp, local_path, filename, FTP_FOLDER_HASIL)
+    try:
+        shutil.move(local_path, os.path.join(LOCAL_RESULT_DIR, filename))
+    except OSError as e:
+        print(f"Error saat memindahkan file di folder lokal: {e}")
+
+def deliver_batch(ftp_pool, window, contents, result, source_dir=None, publish=True, archive_sources=True):
+    """Tahap kirim: menyimpan/mengunggah hasil, mempublikasikan, lalu mengarsipkan file sumber."""
+    # source_dir diisi pada mode lokal: file sumber dibaca dari folder itu, bukan dari FTP.
+    # Backfill memakai publish/archive_sources=False karena sumbernya sudah di data_row.
+    # result adalah BatchResult; TDOA dan citra tomografi (bila ada) disimpan sebagai
+    # file terpisah di samping hasil dan ikut di pesan format inline.
+    filenames_to_process = [f['filename'] for f in window]
+    velo_list = result.velocity
+    
+    # --- MODIFIKASI PENAMAAN DAN PAYLOAD ---
+    new_uuid = uuid.uuid4()
+    guid_survey = f"SURVEY-{new_uuid}-2025"
+    result_filename = f"{guid_survey}.json"
+    local_result_path = os.path.join(LOCAL_TEMP_DIR, result_filename)
+    
+    with codecs.open(local_result_path, 'w', encoding='utf-8') as f:
+        json.dump(velo_list, f, indent=4)
+    
+    # Unggah file hasil ke FTP (opsional bila hasil dikirim langsung di pesan)
+    uploaded = False
+    if RESULT_FTP_ARCHIVE:
+        with ftp_pool.session() as ftp:
+            uploaded = upload_to_ftp(ftp, local_result_path, result_filename, FTP_FOLDER_HASIL)
+    if result.tdoa is not None:
+        save_side_result(ftp_pool, f"{guid_survey}-tdoa.json", {
+            "GUID_SURVEY": guid_survey,
+            "tdoa": result.tdoa, # ketukan x 8 x 8, detik, |tdoa[i][j]| = ToF kanal i terhadap referensi j
+        })
+    if result.image is not None:
+        save_side_result(ftp_pool, f"{guid_survey}-tomografi.json", {
+            "GUID_SURVEY": guid_survey,
+            "method": TOMOGRAPHY_METHOD,
+            "diameter": DIAMETER,
+            "velocity_image": result.image, # grid x grid, m/s, baris 0 di atas, 0 di luar penampang
+        })
+    
+    # Format "inline" membawa matriks di dalam pesan sehingga konsumen tidak perlu mengambil dari FTP
+    notified = False
+    if publish and RESULT_MESSAGE_FORMAT == "inline":
+        result_message = encode_result_message(guid_survey, result_filename, velo_list, filenames_to_process,
+                                               result.tdoa, result.image)
+        notified = publish_to_rabbitmq(result_message, RABBITMQ_QUEUE)
+    elif publish and uploaded:
+        notified = publish_to_rabbitmq(result_filename, RABBITMQ_QUEUE)
+    
+    stored = uploaded or (RESULT_MESSAGE_FORMAT == "inline" and notified)
+    if not publish:
+        stored = uploaded or not RESULT_FTP_ARCHIVE # tanpa publikasi, hasil cukup tersimpan lokal
+    if stored and publish:
+        graph_payload = {"GUID_SURVEY": guid_survey, "data": filenames_to_process}
+        source_files_json = json.dumps(graph_payload)
+        publish_to_rabbitmq(source_files_json, RABBITMQ_GRAPH_QUEUE)
+    
+    if stored and archive_sources:
+        # Pindahkan 8 file sumber ke folder data_row di FTP. Hasil sudah terkirim,
+        # jadi kegagalan di sini (termasuk tidak mendapat sesi FTP) hanya dicatat.
+        try:
+            with ftp_pool.session() as ftp:
+                if source_dir:
+                    failed = archive_local_sources(ftp, contents, source_dir, FTP_FOLDER_DATA_ROW)
+                else:
+                    failed = archive_on_ftp(ftp, contents, FTP_SOURCE_FOLDER, FTP_FOLDER_DATA_ROW)
+            if not failed:
+                print(f"File sumber untuk batch {guid_survey} telah dipindahkan dari folder sumber.")
+        except all_errors as e:
+            print(f"Error saat mengarsipkan file sumber batch {guid_survey} (hasil tetap terkirim): {e}")
+
+    # Pindahkan file hasil lokal dari temp
+    try:
+        shutil.move(local_result_path, os.path.join(LOCAL_RESULT_DIR, result_filename))
+        print(f"File hasil '{result_filename}' telah disimpan ke '{LOCAL_RESULT_DIR}'.")
+    except OSError as e:
+        print(f"Error saat memindahkan file di folder lokal: {e}")
+    
+    return stored
+
+def handle_batch(ftp_pool, window, source_dir=None):
+    """Mengunduh, memproses, mengunggah dan mempublikasikan satu batch 8 file."""
+    if source_dir:
+        contents = read_local_batch(source_dir, window)
+    else:
+        contents = fetch_batch(ftp_pool, window)
+    result = compute_batch(contents, workers=PROCESSING_WORKERS)
+    return deliver_batch(ftp_pool, window, contents, result, source_dir=source_dir)
+
+def handle_batch_safely(ftp_pool, window, source_dir=None):
+    """Memanggil handle_batch dan mencatat error tanpa menghentikan batch lain."""
+    try:
+        return handle_batch(ftp_pool, window, source_dir=source_dir)
+    except Exception as e:
+        print(f"Error saat memproses batch {window[0]['guid']}: {e}")
+        return False
+
+def process_ready_batches(ftp_pool, ready_batches, source_dir=None):
+    """Memproses semua batch siap secara berurutan atau paralel, mengembalikan batch yang gagal."""
+    if BATCH_WORKERS > 1 and len(ready_batches) > 1:
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            results = list(pool.map(lambda window: handle_batch_safely(ftp_pool, window, source_dir), ready_batches))
+    else:
+        results = [handle_batch_safely(ftp_pool, window, source_dir) for window in ready_batches]
+    return [window for window, ok in zip(ready_batches, results) if not ok]
+
+def poll_new_batches(ftp_pool, listing, assembler, first_poll=False):
+    """Memeriksa listing FTP dan mengembalikan (batch baru yang lengkap, nama file yang hilang)."""
+    with ftp_pool.session() as ftp:
+        changed, removed = listing.poll(ftp)
+    removed = set(removed)
+    if changed or removed:
+        print(f"Listing FTP berubah: {len(changed)} file baru/berubah, {len(removed)} file hilang.")
+    # Polling pertama memasukkan seluruh isi snapshot ke assembler; setelah itu
+    # hanya file baru/berubah.
+    if first_poll:
+        changed = list(listing.entries)
+    assembler.discard(removed)
+    return collect_ready_batches(assembler, changed), removed
+
+def validate_config(publish=True):
+    """Menolak konfigurasi yang salah ketik atau kombinasi yang membuat hasil tidak pernah tersimpan."""
+    # onetap() menangkap error per baris dan mengembalikan baris nol, jadi nilai
+    # yang salah ketik di sini akan menghasilkan matriks nol untuk setiap survei.
+    if PEAK_REFINEMENT and PEAK_REFINEMENT not in PEAK_REFINEMENTS:
+        raise SystemExit(f"PEAK_REFINEMENT tidak dikenal: '{PEAK_REFINEMENT}' "
+                         f"(pilih {', '.join(PEAK_REFINEMENTS)} atau kosong).")
+    unknown = [w for w in GCC_WEIGHTING if w not in GCC_WEIGHTINGS]
+    if unknown:
+        raise SystemExit(f"GCC_WEIGHTING tidak dikenal: {', '.join(unknown)} "
+                         f"(pilih dari {', '.join(GCC_WEIGHTINGS)}).")
+    # Dengan format "filename" pesan hanya dikirim setelah hasil terunggah ke FTP,
+    # jadi tanpa RESULT_FTP_ARCHIVE setiap batch dianggap gagal dan dihitung ulang terus.
+    if RESULT_MESSAGE_FORMAT not in ("filename", "inline"):
+        raise SystemExit(f"RESULT_MESSAGE_FORMAT tidak dikenal: '{RESULT_MESSAGE_FORMAT}' (pilih filename atau inline).")
+    if publish and not RESULT_FTP_ARCHIVE and RESULT_MESSAGE_FORMAT != "inline":
+        raise SystemExit("RESULT_FTP_ARCHIVE=0 hanya bisa dipakai dengan RESULT_MESSAGE_FORMAT=inline; "
+                         "dengan format filename hasil tidak pernah terunggah maupun dipublikasikan.")
+
+def prepare_local_dirs():
+    """Membuat folder lokal yang dibutuhkan bila belum ada."""
+    watch_dir = LOCAL_WATCH_DIR if INGEST_MODE == "local" else ""
+    for dir_path in [LOCAL_RESULT_DIR, LOCAL_TEMP_DIR, LOCAL_RAW_ARCHIVE_DIR, watch_dir]:
+        if not dir_path:
+            continue
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+            print(f"Folder '{dir_path}' telah dibuat.")
+
+def create_ftp_pool():
+    """Membuat pool sesi FTP ke folder sumber sesuai konfigurasi."""
+    return FtpSessionPool(FTP_HOST, FTP_PORT, FTP_USER, FTP_PASSWORD, size=FTP_POOL_SIZE,
+                          keepalive_seconds=FTP_KEEPALIVE_SECONDS, cwd=FTP_SOURCE_FOLDER)
+
 # =============================================================================
 # EKSEKUSI UTAMA (DAEMON)
 # =============================================================================
 def main():
     """Loop utama untuk memonitor FTP dan memproses file."""
-    for dir_path in [LOCAL_RESULT_DIR, LOCAL_TEMP_DIR]:
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-            print(f"Folder '{dir_path}' telah dibuat.")
+    validate_config()
+    prepare_local_dirs()
+
+    # Sesi FTP dipakai ulang antar polling dan untuk unduhan paralel
+    ftp_pool = create_ftp_pool()
+    listing = FtpListingIndex(FTP_LISTING_SNAPSHOT)
+    assembler = BatchAssembler(GROUPING_TIME_WINDOW_MINUTES * 60)
+    # Batch yang gagal dicoba ulang pada polling berikutnya.
+    first_poll = True
+    retry_batches = []
 
     while True:
-        batch_processed = False
+        processed = 0
         print(f"\n[{datetime.now()}] Menghubungkan ke FTP untuk memeriksa folder: '{FTP_SOURCE_FOLDER}'...")
         try:
-            with FTP() as ftp:
-                ftp.connect(FTP_HOST, FTP_PORT)
-                ftp.login(FTP_USER, FTP_PASSWORD)
-                ftp.cwd(FTP_SOURCE_FOLDER)
-
-                files_on_ftp = ftp.nlst()
-                groups_by_guid = defaultdict(list)
-                for filename in files_on_ftp:
-                    parsed_info = parse_filename(filename)
-                    if parsed_info:
-                        groups_by_guid[parsed_info['guid']].append(parsed_info)
-
-                for guid, files in groups_by_guid.items():
-                    if len(files) < 8:
-                        continue
-
-                    files.sort(key=lambda x: x['timestamp'])
-
-                    for i in range(len(files) - 7):
-                        window = files[i : i + 8]
-                        
-                        time_diff = window[-1]['timestamp'] - window[0]['timestamp']
-                        if time_diff <= GROUPING_TIME_WINDOW_MINUTES * 60:
-                            indices = {f['index'] for f in window}
-                            if indices == set(range(1, 9)):
-                                print(f"Batch valid ditemukan untuk GUID {guid} dengan rentang waktu {time_diff} detik.")
-                                
-                                # Download file batch ke folder temp
-                                filenames_to_process = [f['filename'] for f in window]
-                                local_paths = []
-                                for fname in filenames_to_process:
-                                    local_path = os.path.join(LOCAL_TEMP_DIR, fname)
-                                    with open(local_path, 'wb') as f_local:
-                                        ftp.retrbinary(f'RETR {fname}', f_local.write)
-                                    local_paths.append(local_path)
-                                print(f"Berhasil mengunduh {len(local_paths)} file ke '{LOCAL_TEMP_DIR}'.")
-
-                                # --- MODIFIKASI PENAMAAN DAN PAYLOAD ---
-                                new_uuid = uuid.uuid4()
-                                guid_survey = f"SURVEY-{new_uuid}-2025"
-                                result_filename = f"{guid_survey}.json"
-                                local_result_path = os.path.join(LOCAL_TEMP_DIR, result_filename)
-                                
-                                velo_matrix = process_batch(local_paths, DIAMETER)
-                                velo_list = np.nan_to_num(velo_matrix, posinf=0).tolist()
-                                with codecs.open(local_result_path, 'w', encoding='utf-8') as f:
-                                    json.dump(velo_list, f, indent=4)
-                                
-                                # Unggah file hasil ke FTP
-                                if upload_to_ftp(ftp, local_result_path, result_filename, FTP_FOLDER_HASIL):
-                                    publish_to_rabbitmq(result_filename, RABBITMQ_QUEUE)
-                                    
-                                    graph_payload = {"GUID_SURVEY": guid_survey, "data": filenames_to_process}
-                                    source_files_json = json.dumps(graph_payload)
-                                    publish_to_rabbitmq(source_files_json, RABBITMQ_GRAPH_QUEUE)
-                                    
-                                    # Unggah 8 file sumber ke folder data_row di FTP
-                                    for path in local_paths:
-                                        upload_to_ftp(ftp, path, os.path.basename(path), FTP_FOLDER_DATA_ROW)
-
-                                    # Hapus file sumber dari FTP folder asal
-                                    ftp.cwd(FTP_SOURCE_FOLDER)
-                                    for fname in filenames_to_process:
-                                        ftp.delete(fname)
-                                    print(f"File sumber untuk batch {guid_survey} telah dihapus dari FTP.")
-
-                                # Pindahkan file hasil lokal & bersihkan temp
-                                try:
-                                    shutil.move(local_result_path, os.path.join(LOCAL_RESULT_DIR, result_filename))
-                                    print(f"File hasil '{result_filename}' telah disimpan ke '{LOCAL_RESULT_DIR}'.")
-                                    # Hapus file sumber yang diunduh dari temp
-                                    for path in local_paths:
-                                        os.remove(path)
-                                except OSError as e:
-                                    print(f"Error saat memindahkan/menghapus file di folder lokal: {e}")
-                                
-                                batch_processed = True
-                                break
-                    if batch_processed:
-                        break
+            new_batches, removed = poll_new_batches(ftp_pool, listing, assembler, first_poll)
+            first_poll = False
+            retry_batches = [w for w in retry_batches if not any(f['filename'] in removed for f in w)]
+            ready_batches = retry_batches + new_batches
+            # Tetap dicoba ulang bila terjadi error di tengah pemrosesan
+            retry_batches = ready_batches
+            if ready_batches:
+                print(f"{len(ready_batches)} batch siap diproses.")
+                retry_batches = process_ready_batches(ftp_pool, ready_batches)
+                processed = len(ready_batches) - len(retry_batches)
         except Exception as e:
             print(f"Terjadi error pada loop utama: {e}")
 
+        # Bila ada batch yang berhasil diproses, langsung periksa lagi tanpa menunggu
+        if processed:
+            continue
+
         print(f"Menunggu {PROCESSING_INTERVAL_SECONDS} detik sebelum pengecekan berikutnya...")
+        ftp_pool.keepalive()
+        get_rabbitmq_publisher().keepalive()
         time.sleep(PROCESSING_INTERVAL_SECONDS)
 
+def main_local():
+    """Loop utama mode lokal: memantau LOCAL_WATCH_DIR dan memproses batch begitu file ke-8 masuk."""
+    validate_config()
+    prepare_local_dirs()
+
+    # FTP tetap dipakai untuk hasil dan arsip data_row, sama seperti mode FTP
+    ftp_pool = create_ftp_pool()
+    watcher = LocalDirectoryWatcher(LOCAL_WATCH_DIR, poll_seconds=LOCAL_WATCH_POLL_SECONDS)
+    assembler = BatchAssembler(GROUPING_TIME_WINDOW_MINUTES * 60)
+    mode = "inotify" if watcher.inotify is not None else "polling scandir"
+    print(f"[{datetime.now()}] Memantau folder lokal '{LOCAL_WATCH_DIR}' ({mode})...")
+    changed, removed = watcher.scan_existing(), []
+    retry_batches = []
+
+    while True:
+        try:
+            assembler.discard(removed)
+            new_batches = collect_ready_batches(assembler, changed)
+            retry_batches = [w for w in retry_batches if not any(f['filename'] in removed for f in w)]
+            ready_batches = retry_batches + new_batches
+            retry_batches = ready_batches
+            if ready_batches:
+                print(f"{len(ready_batches)} batch siap diproses.")
+                retry_batches = process_ready_batches(ftp_pool, ready_batches, source_dir=LOCAL_WATCH_DIR)
+        except Exception as e:
+            print(f"Terjadi error pada loop utama: {e}")
+
+        # Menunggu event berikutnya; bila tidak ada apa-apa, jaga koneksi tetap hidup
+        changed, removed = watcher.wait(PROCESSING_INTERVAL_SECONDS)
+        if not changed and not removed:
+            ftp_pool.keepalive()
+            get_rabbitmq_publisher().keepalive()
+
 if __name__ == "__main__":
-    main()
+    if INGEST_MODE == "local":
+        main_local()
+    else:
+        main()
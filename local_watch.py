@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import time
+
+try:
+    from inotify_simple import INotify, flags # Opsional: notifikasi kernel Linux
+except ImportError:
+    INotify = None
+
+
+class LocalDirectoryWatcher:
+    """Memantau folder lokal dan melaporkan file yang selesai ditulis atau dihapus."""
+
+    # Dengan inotify, file dilaporkan begitu ditutup setelah ditulis (CLOSE_WRITE)
+    # atau dipindahkan masuk (MOVED_TO). Tanpa inotify jatuh ke polling scandir:
+    # file baru dilaporkan setelah ukuran dan mtime-nya stabil selama satu putaran
+    # agar file yang masih ditulis tidak ikut diproses.
+    def __init__(self, path, poll_seconds=0.5):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.entries = {}  # nama file -> (size, mtime) yang sudah dilaporkan
+        self.pending = {}  # nama file -> (size, mtime) yang belum stabil
+        self.inotify = None
+        if INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(path, flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM)
+            except OSError as e:
+                print(f"inotify tidak bisa dipakai untuk '{path}' ({e}), beralih ke polling scandir.")
+                self.inotify = None
+
+    def list_entries(self):
+        """Mengambil isi folder sebagai dict nama -> (size, mtime)."""
+        entries = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return entries
+
+    def scan_existing(self):
+        """Mengembalikan semua file yang sudah ada saat daemon mulai."""
+        self.entries = self.list_entries()
+        return list(self.entries)
+
+    def wait(self, timeout):
+        """Menunggu perubahan maksimal `timeout` detik, mengembalikan (baru_atau_berubah, terhapus)."""
+        if self.inotify is not None:
+            return self.wait_inotify(timeout)
+        return self.wait_scandir(timeout)
+
+    def wait_inotify(self, timeout):
+        """Membaca event inotify; kembali segera setelah ada event."""
+        changed, removed = [], []
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if not event.name:
+                continue
+            if event.mask & (flags.CLOSE_WRITE | flags.MOVED_TO):
+                changed.append(event.name)
+            elif event.mask & (flags.DELETE | flags.MOVED_FROM):
+                removed.append(event.name)
+        # Nama yang sama bisa muncul di kedua daftar; kondisi akhir di disk yang menentukan
+        changed = [name for name in dict.fromkeys(changed) if os.path.isfile(os.path.join(self.path, name))]
+        removed = [name for name in dict.fromkeys(removed) if name not in changed]
+        return changed, removed
+
+    def wait_scandir(self, timeout):
+        """Memindai folder tiap `poll_seconds` sampai ada perubahan yang stabil atau timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.list_entries()
+            changed = []
+            for name, facts in current.items():
+                if self.entries.get(name) == facts:
+                    continue
+                if self.pending.get(name) == facts:
+                    changed.append(name)
+                    self.entries[name] = facts
+                    del self.pending[name]
+                else:
+                    self.pending[name] = facts
+            removed = [name for name in self.entries if name not in current]
+            for name in removed:
+                del self.entries[name]
+            self.pending = {name: facts for name, facts in self.pending.items() if name in current}
+            if changed or removed or time.monotonic() >= deadline:
+                return changed, removed
+            time.sleep(self.poll_seconds)
+
+    def close(self):
+        """Menutup file descriptor inotify bila ada."""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from batch_assembler import BatchAssembler
+from ftp_listing import FtpListingIndex
+from index import (
+    BATCH_WORKERS, DIAMETER, FTP_LISTING_SNAPSHOT, FTP_SOURCE_FOLDER, GROUPING_TIME_WINDOW_MINUTES,
+    PROCESSING_INTERVAL_SECONDS, PROCESSING_WORKERS, TDOA_MATRIX,
+    compute_batch, create_ftp_pool, deliver_batch, fetch_batch, get_rabbitmq_publisher, lookup_cached_rows,
+    poll_new_batches, prepare_local_dirs, store_cached_rows, validate_config,
+)
+
+# =============================================================================
+# KONFIGURASI PIPELINE
+# =============================================================================
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4)) # Batas batch yang menunggu di antara tahap
+
+
+# =============================================================================
+# TAHAP-TAHAP PIPELINE
+# =============================================================================
+async def list_stage(ftp_pool, download_queue, retry_batches):
+    """Tahap listing: memeriksa FTP dan memasukkan batch lengkap ke antrian unduh."""
+    listing = FtpListingIndex(FTP_LISTING_SNAPSHOT)
+    assembler = BatchAssembler(GROUPING_TIME_WINDOW_MINUTES * 60)
+    first_poll = True
+
+    while True:
+        new_batches = []
+        print(f"\n[{datetime.now()}] Memeriksa folder FTP: '{FTP_SOURCE_FOLDER}'...")
+        try:
+            new_batches, removed = await asyncio.to_thread(poll_new_batches, ftp_pool, listing, assembler, first_poll)
+            first_poll = False
+            retries = [w for w in retry_batches if not any(f['filename'] in removed for f in w)]
+            retry_batches.clear()
+            # put() menunggu bila antrian penuh, sehingga listing ikut melambat (backpressure)
+            for window in retries + new_batches:
+                await download_queue.put(window)
+        except Exception as e:
+            print(f"Terjadi error pada tahap listing: {e}")
+
+        # Hanya tidur bila tidak ada batch baru; batch yang dicoba ulang tidak dihitung
+        if not new_batches:
+            await asyncio.to_thread(ftp_pool.keepalive)
+            await asyncio.to_thread(get_rabbitmq_publisher().keepalive)
+            await asyncio.sleep(PROCESSING_INTERVAL_SECONDS)
+
+async def download_stage(ftp_pool, download_queue, compute_queue, retry_batches):
+    """Tahap unduh: mengambil 8 file tiap batch ke memori di thread terpisah."""
+    while True:
+        window = await download_queue.get()
+        try:
+            contents = await asyncio.to_thread(fetch_batch, ftp_pool, window)
+        except Exception as e:
+            print(f"Error saat mengunduh batch {window[0]['guid']}: {e}")
+            retry_batches.append(window)
+            continue
+        finally:
+            download_queue.task_done()
+        await compute_queue.put((window, contents))
+
+async def compute_stage(executor, compute_queue, deliver_queue, retry_batches):
+    """Tahap hitung: menjalankan GCC di process pool agar event loop tetap bebas."""
+    # Cache baris hanya dibaca dan ditulis di proses ini; worker menerima baris
+    # yang sudah ada dan mengembalikan sisanya, sehingga file cache baris tidak
+    # ditimpa oleh tiap worker dan statistik hit/miss terkumpul di sini.
+    loop = asyncio.get_running_loop()
+    while True:
+        window, contents = await compute_queue.get()
+        try:
+            cached_rows = await asyncio.to_thread(lookup_cached_rows, contents, DIAMETER, TDOA_MATRIX)
+            result = await loop.run_in_executor(executor, compute_batch, contents, None, cached_rows)
+            await asyncio.to_thread(store_cached_rows, contents, DIAMETER, result.velocity, cached_rows)
+        except Exception as e:
+            print(f"Error saat menghitung batch {window[0]['guid']}: {e}")
+            retry_batches.append(window)
+            continue
+        finally:
+            compute_queue.task_done()
+        await deliver_queue.put((window, contents, result))
+
+async def deliver_stage(ftp_pool, deliver_queue, retry_batches):
+    """Tahap kirim: unggah hasil, publikasi, dan arsip file sumber di thread terpisah."""
+    while True:
+        window, contents, result = await deliver_queue.get()
+        try:
+            if not await asyncio.to_thread(deliver_batch, ftp_pool, window, contents, result):
+                retry_batches.append(window)
+        except Exception as e:
+            print(f"Error saat mengirim hasil batch {window[0]['guid']}: {e}")
+            retry_batches.append(window)
+        finally:
+            deliver_queue.task_done()
+
+# =============================================================================
+# EKSEKUSI UTAMA (DAEMON ASYNCIO)
+# =============================================================================
+async def main_async():
+    """Menjalankan pipeline listing -> unduh -> hitung -> kirim secara tumpang tindih."""
+    validate_config()
+    prepare_local_dirs()
+    ftp_pool = create_ftp_pool()
+    retry_batches = []
+    download_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    compute_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    deliver_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    io_workers = max(1, BATCH_WORKERS)
+    compute_workers = max(1, PROCESSING_WORKERS)
+
+    # Batch N+1 diunduh saat batch N dihitung dan batch N-1 dikirim
+    with ProcessPoolExecutor(max_workers=compute_workers) as executor:
+        tasks = [list_stage(ftp_pool, download_queue, retry_batches)]
+        tasks += [download_stage(ftp_pool, download_queue, compute_queue, retry_batches) for _ in range(io_workers)]
+        tasks += [compute_stage(executor, compute_queue, deliver_queue, retry_batches) for _ in range(compute_workers)]
+        tasks += [deliver_stage(ftp_pool, deliver_queue, retry_batches) for _ in range(io_workers)]
+        await asyncio.gather(*tasks)
+
+def main():
+    """Titik masuk daemon asyncio."""
+    asyncio.run(main_async())
+
+if __name__ == "__main__":
+    main()
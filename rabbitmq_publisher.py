@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+import time
+
+import pika
+
+
+class PendingMessage:
+    """Satu pesan yang menunggu dipublikasikan beserta hasil konfirmasinya."""
+
+    def __init__(self, body, queue_name):
+        self.body = body
+        self.queue_name = queue_name
+        self.done = threading.Event()
+        self.ok = False
+
+
+class RabbitMQPublisher:
+    """Publisher RabbitMQ berumur panjang: satu koneksi dan channel dengan publisher confirms."""
+
+    # Pesan dari beberapa thread dikumpulkan di `pending` lalu dikirim berurutan
+    # oleh satu thread yang memegang koneksi (BlockingConnection tidak thread-safe).
+    # Bila koneksi putus, dibuka ulang dengan jeda yang bertambah (backoff).
+    def __init__(self, parameters, max_retries=5, backoff_seconds=1, max_backoff_seconds=30,
+                 connection_factory=pika.BlockingConnection):
+        self.parameters = parameters
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.connection_factory = connection_factory
+        self.connection = None
+        self.channel = None
+        self.declared_queues = set()
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.connection_lock = threading.Lock()
+
+    def connect(self):
+        """Membuka koneksi dan channel baru dengan publisher confirms aktif."""
+        self.connection = self.connection_factory(self.parameters)
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self.declared_queues = set()
+
+    def disconnect(self):
+        """Menutup koneksi (bila masih terbuka) agar dibuka ulang pada publikasi berikutnya."""
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+        self.channel = None
+
+    def declare(self, queue_name):
+        """Mendeklarasikan antrian sekali per koneksi."""
+        if queue_name not in self.declared_queues:
+            self.channel.queue_declare(queue=queue_name, durable=False)
+            self.declared_queues.add(queue_name)
+
+    def send(self, message):
+        """Mengirim satu pesan dan menunggu konfirmasi broker, dengan reconnect + backoff."""
+        delay = self.backoff_seconds
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.connection is None or not self.connection.is_open:
+                    self.connect()
+                self.declare(message.queue_name)
+                self.channel.basic_publish(
+                    exchange='',
+                    routing_key=message.queue_name,
+                    body=message.body,
+                    properties=pika.BasicProperties(delivery_mode=2)
+                )
+                return True
+            except Exception as e:
+                print(f"Error saat publikasi ke antrian '{message.queue_name}' (percobaan {attempt + 1}): {e}")
+                self.disconnect()
+                if attempt < self.max_retries:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff_seconds)
+        return False
+
+    def flush(self):
+        """Mengirim semua pesan yang menunggu memakai koneksi yang sama."""
+        with self.connection_lock:
+            with self.pending_lock:
+                batch, self.pending = self.pending, []
+            for message in batch:
+                message.ok = self.send(message)
+                message.done.set()
+
+    def publish(self, message, queue_name):
+        """Mempublikasikan pesan ke antrian dan mengembalikan True bila dikonfirmasi broker."""
+        pending = PendingMessage(message, queue_name)
+        with self.pending_lock:
+            self.pending.append(pending)
+        # Bila thread lain sedang mengirim, pesan ini ikut terkirim di batch berikutnya
+        while not pending.done.is_set():
+            self.flush()
+        return pending.ok
+
+    def keepalive(self):
+        """Melayani heartbeat koneksi saat daemon sedang menganggur."""
+        with self.connection_lock:
+            if self.connection is None:
+                return
+            try:
+                self.connection.process_data_events(time_limit=0)
+            except Exception as e:
+                print(f"Koneksi RabbitMQ terputus saat menganggur: {e}")
+                self.disconnect()
+
+    def close(self):
+        """Mengirim sisa pesan lalu menutup koneksi."""
+        self.flush()
+        with self.connection_lock:
+            self.disconnect()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class RowCache:
+    """Cache baris kecepatan per file ketukan, dikunci dengan hash isi file + which + diameter."""
+
+    # Baris diurutkan dari yang paling lama tidak dipakai; bila jumlahnya
+    # melebihi `max_entries`, yang paling lama dibuang (LRU). Isi cache
+    # disimpan ke disk agar tetap berlaku setelah daemon restart, sebagai log
+    # JSON Lines ([kunci, baris] per baris): save() hanya menambahkan baris baru,
+    # dan file baru ditulis ulang penuh (dipadatkan) bila log sudah lebih dari
+    # dua kali `max_entries`, agar gateway dengan kartu SD tidak menulis seluruh
+    # cache setiap batch.
+    def __init__(self, path=None, max_entries=4096, version=""):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.version = version  # versi algoritma dan parameter perhitungan yang ikut menentukan hasil
+        self.rows = OrderedDict()  # kunci -> list 8 float
+        self.pending = []  # kunci yang belum ditulis ke log
+        self.log_lines = 0  # jumlah baris di file log
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.load()
+
+    def key(self, data, which, diameter):
+        """Membentuk kunci cache dari isi file (bytes), nomor sensor dan diameter."""
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}:{which}:{float(diameter)!r}:{self.version}"
+
+    def load(self):
+        """Memuat cache dari log di disk bila ada; baris yang rusak (mis. tulisan terpotong) dilewati."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        suffix = f":{self.version}"
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self.log_lines += 1
+                    try:
+                        key, row = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    if isinstance(key, str) and key.endswith(suffix): # versi lain tidak pernah dipakai lagi
+                        self.rows[key] = row
+                        self.rows.move_to_end(key)
+        except OSError as e:
+            print(f"Cache baris '{self.path}' tidak bisa dibaca, mulai dari kosong: {e}")
+            self.rows = OrderedDict()
+        self.evict()
+
+    def save(self):
+        """Menambahkan baris baru ke log di disk, atau menulis ulang log bila sudah terlalu panjang."""
+        if not self.path:
+            return
+        with self.file_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                compact = self.log_lines + len(self.pending) > 2 * self.max_entries
+                if compact:
+                    entries = list(self.rows.items())
+                else:
+                    entries = [(key, self.rows[key]) for key in dict.fromkeys(self.pending) if key in self.rows]
+                self.pending = []
+            lines = "".join(json.dumps([key, row]) + "\n" for key, row in entries)
+            try:
+                if compact:
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(lines)
+                    os.replace(tmp_path, self.path)
+                    self.log_lines = len(entries)
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(lines)
+                    self.log_lines += len(entries)
+            except OSError as e:
+                print(f"Error saat menyimpan cache baris: {e}")
+
+    def evict(self):
+        """Membuang baris yang paling lama tidak dipakai sampai muat di `max_entries`."""
+        while len(self.rows) > self.max_entries:
+            self.rows.popitem(last=False)
+
+    def get(self, key):
+        """Mengembalikan baris (float32) untuk kunci, atau None bila belum ada."""
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self.rows.move_to_end(key)
+            self.hits += 1
+            return np.array(row, dtype=np.float32)
+
+    def put(self, key, row):
+        """Menyimpan satu baris hasil onetap."""
+        with self.lock:
+            self.rows[key] = np.asarray(row, dtype=np.float64).tolist()
+            self.rows.move_to_end(key)
+            self.pending.append(key)
+            self.evict()
+
+    def stats(self):
+        """Ringkasan untuk monitoring: jumlah hit, miss dan isi cache."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.rows)}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import scipy.sparse
+
+SENSOR_COUNT = 8
+
+
+def sensor_positions(diameter, sensor_count=SENSOR_COUNT):
+    """Posisi (x, y) sensor yang berjarak sama di keliling lingkaran, sensor 1 di sudut 0."""
+    # Jarak antar sensor sama dengan chord ab, ac, ad, ae di onetap()
+    angles = 2 * np.pi * np.arange(sensor_count) / sensor_count
+    return diameter / 2 * np.column_stack((np.cos(angles), np.sin(angles)))
+
+def ray_system_matrix(grid, diameter, samples_per_pixel=2, sensor_count=SENSOR_COUNT):
+    """Matriks sistem sinar-piksel (sparse, sensor_count^2 x grid^2) untuk semua pasangan sensor (i, j)."""
+
+    # Cukup mahal untuk grid besar; pemanggil berulang sebaiknya lewat GeometryCache.
+    # Baris i * sensor_count + j adalah sinar lurus dari sensor i ke sensor j, urutan sama
+    # dengan elemen matriks kecepatan yang di-flatten (baris i == j kosong).
+    # Isi matriks = panjang sinar (meter) di tiap piksel, didekati dengan mencuplik
+    # sinar secara merata (samples_per_pixel titik per lebar piksel) lalu
+    # menjumlahkan per piksel.
+    # Grid menutupi bujur sangkar [-r, r] x [-r, r]; baris citra 0 ada di atas.
+    # Mengembalikan (matriks csr, panjang tiap sinar, mask piksel di dalam lingkaran).
+    radius = diameter / 2
+    pixel = diameter / grid
+    positions = sensor_positions(diameter, sensor_count)
+    start = np.repeat(positions, sensor_count, axis=0)
+    end = np.tile(positions, (sensor_count, 1))
+    lengths = np.linalg.norm(end - start, axis=1)
+
+    samples = samples_per_pixel * grid
+    t = (np.arange(samples) + 0.5) / samples
+    points = start[:, None, :] + t[None, :, None] * (end - start)[:, None, :]
+    cols = np.clip(np.floor((points[..., 0] + radius) / pixel).astype(np.int64), 0, grid - 1)
+    rows = np.clip(np.floor((radius - points[..., 1]) / pixel).astype(np.int64), 0, grid - 1)
+
+    ray_index = np.repeat(np.arange(len(lengths)), samples)
+    weights = np.repeat(lengths / samples, samples)
+    matrix = scipy.sparse.coo_matrix((weights, (ray_index, (rows * grid + cols).ravel())),
+                                     shape=(len(lengths), grid * grid)).tocsr() # duplikat dijumlahkan
+
+    centres = (np.arange(grid) + 0.5) * pixel - radius
+    mask = np.hypot(centres[None, :], centres[::-1, None]) <= radius
+    return matrix, lengths, mask
+
+def reconstruct(velo_matrix, diameter, grid=128, method="sirt", iterations=50, system=None):
+    """Citra kecepatan (grid x grid, m/s) penampang dari matriks kecepatan 8x8, 0 di luar lingkaran."""
+
+    # Tiap elemen velo[i][j] > 0 menjadi satu pengamatan waktu tempuh
+    # t = panjang chord / kecepatan di sepanjang sinar lurus i -> j; elemen 0
+    # (diagonal atau gagal dihitung) diabaikan. Yang direkonstruksi adalah
+    # slowness (1/kecepatan) per piksel:
+    #   "backprojection": rata-rata slowness sinar yang melewati piksel, berbobot panjang.
+    #   "sirt": iterasi s += C * A^T * R * (t - A s) dari slowness rata-rata,
+    #           R dan C kebalikan jumlah baris dan kolom A.
+    # Piksel yang tidak dilewati sinar valid tetap bernilai slowness rata-rata.
+    # system (opsional) adalah hasil ray_system_matrix() yang sudah ada, mis. dari GeometryCache.
+    if method not in ("backprojection", "sirt"):
+        raise ValueError(f"Metode tomografi tidak dikenal: {method}")
+    velo = np.asarray(velo_matrix, dtype=np.float64)
+    if system is None:
+        system = ray_system_matrix(grid, float(diameter), sensor_count=len(velo))
+    matrix, lengths, mask = system
+    velo = velo.ravel()
+    valid = np.isfinite(velo) & (velo > 0)
+    image = np.zeros((grid, grid), dtype=np.float32)
+    if not valid.any():
+        return image
+
+    A = matrix[np.flatnonzero(valid)]
+    travel = lengths[valid] / velo[valid]
+    ray_slowness = 1 / velo[valid]
+    col_sums = np.asarray(A.sum(axis=0)).ravel()
+    col_scale = np.divide(1, col_sums, out=np.zeros_like(col_sums), where=col_sums > 0)
+    mean_slowness = np.mean(ray_slowness)
+
+    if method == "backprojection":
+        slowness = np.where(col_sums > 0, (A.T @ ray_slowness) * col_scale, mean_slowness)
+    else:
+        row_scale = 1 / np.asarray(A.sum(axis=1)).ravel()
+        slowness = np.full(grid * grid, mean_slowness)
+        for _ in range(iterations):
+            slowness += col_scale * (A.T @ (row_scale * (travel - A @ slowness)))
+            np.maximum(slowness, 0, out=slowness) # slowness tidak boleh negatif
+
+    slowness = slowness.reshape(grid, grid)
+    np.divide(1, slowness, out=image, where=mask & (slowness > 0), casting="unsafe")
+    return image